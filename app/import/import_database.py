@@ -1,8 +1,20 @@
 import sys
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pymongo import MongoClient
-from sqlalchemy import create_engine
-from pymongo.errors import ExecutionTimeout, PyMongoError
+from sqlalchemy import create_engine, text
+from pymongo.errors import BulkWriteError, ExecutionTimeout, PyMongoError
+from pymongo.write_concern import WriteConcern
+from bson import ObjectId
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# pymongoarrow là thư viện tùy chọn, giúp decode BSON thẳng sang Arrow không qua dict Python
+try:
+    from pymongoarrow.api import find_pandas_all
+except ImportError:
+    find_pandas_all = None
 
 sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "import"))
 from import_env import load_env
@@ -20,15 +32,108 @@ twan_engine = create_engine(load_env("TWAN_URI"))
 cts_engine = create_engine(load_env("CTS_URI"))
 t2m_engine = create_engine(load_env("T2M_URI"))
 
+# Thư mục lưu cache cục bộ cho các collection tham chiếu (app/cache/mongo)
+MONGO_CACHE_DIR = os.path.join(os.path.dirname(os.getcwd()), "cache", "mongo")
+MONGO_CACHE_TTL_SECONDS = 6 * 60 * 60  # Quá thời gian này sẽ tải lại toàn bộ collection
+MONGO_SYNC_RECHECK_DAYS = 10  # Số ngày gần nhất luôn được tải lại khi đồng bộ tăng dần
+
+# Thư mục lưu dấu vân tay (hash từng dòng) của lần ghi SQL gần nhất, dùng cho chế độ upsert
+MSSQL_CACHE_DIR = os.path.join(os.path.dirname(os.getcwd()), "cache", "mssql")
+MSSQL_FINGERPRINT_SCHEMA_KEY = b"cts_schema"  # Khóa metadata parquet lưu tên cột và kiểu dữ liệu
+
+# Cache tên collection theo từng database để tránh gọi list_collection_names mỗi lần truy vấn
+COLLECTION_NAME_CACHE_TTL_SECONDS = 60
+_collection_name_cache = {}  # {(id client, tên database): (thời điểm lấy, set tên collection)}
+_collection_name_lock = threading.Lock()
+
 #Các hàm tương tác DBs
-def get_mongo_collection(db_collection, df_name, find_query=None, projection=None):
+def _get_collection_names(db, refresh=False):
+    """Lấy tập tên collection của database, dùng cache nếu chưa quá COLLECTION_NAME_CACHE_TTL_SECONDS"""
+    cache_key = (id(db.client), db.name)
+    with _collection_name_lock:
+        cached = _collection_name_cache.get(cache_key)
+        if not refresh and cached and time.time() - cached[0] < COLLECTION_NAME_CACHE_TTL_SECONDS:
+            return cached[1]
+
+    names = set(db.list_collection_names())
+    with _collection_name_lock:
+        _collection_name_cache[cache_key] = (time.time(), names)
+    return names
+
+
+def _collection_exists(db, name, refresh_on_miss=True):
+    """Kiểm tra collection có tồn tại, nếu không thấy trong cache thì làm mới cache một lần"""
+    if name in _get_collection_names(db):
+        return True
+    if refresh_on_miss:
+        return name in _get_collection_names(db, refresh=True)
+    return False
+
+
+def _update_collection_name_cache(db, added=(), removed=()):
+    """Cập nhật cache sau các thao tác tạo/đổi tên/xóa collection do chính chúng ta thực hiện"""
+    cache_key = (id(db.client), db.name)
+    with _collection_name_lock:
+        cached = _collection_name_cache.get(cache_key)
+        if cached:
+            names = (cached[1] | set(added)) - set(removed)
+            _collection_name_cache[cache_key] = (cached[0], names)
+
+
+def _cursor_to_dataframe(cursor, batch_size):
+    """Đọc cursor theo từng batch, mỗi batch chuyển thành DataFrame rồi ghép một lần ở cuối"""
+    cursor.batch_size(batch_size)
+    batch_dfs = []
+    batch_docs = []
+    for doc in cursor:
+        batch_docs.append(doc)
+        if len(batch_docs) >= batch_size:
+            batch_dfs.append(pd.DataFrame.from_records(batch_docs))
+            batch_docs = []
+    if batch_docs:
+        batch_dfs.append(pd.DataFrame.from_records(batch_docs))
+
+    if not batch_dfs:
+        return pd.DataFrame()
+
+    # Cột toàn null trong một batch bị suy ra kiểu object, làm cả cột thành object sau khi ghép:
+    # ép về kiểu của batch đầu tiên có dữ liệu (giống kết quả khi dựng DataFrame một lần)
+    column_dtypes = {}
+    for batch_df in batch_dfs:
+        for col in batch_df.columns:
+            if col not in column_dtypes and batch_df[col].notna().any():
+                column_dtypes[col] = batch_df[col].dtype
+    for i, batch_df in enumerate(batch_dfs):
+        cast_dtypes = {}
+        for col in batch_df.columns:
+            dtype = column_dtypes.get(col)
+            if dtype is None or batch_df[col].dtype == dtype or batch_df[col].notna().any():
+                continue
+            if dtype.kind in "iu":
+                # Số nguyên không chứa được NaN, pandas cũng chuyển sang float khi có giá trị thiếu
+                cast_dtypes[col] = "float64"
+            elif dtype.kind in "fcmM":
+                cast_dtypes[col] = dtype
+        if cast_dtypes:
+            batch_dfs[i] = batch_df.astype(cast_dtypes)
+    return pd.concat(batch_dfs, axis=0, ignore_index=True)
+
+
+def get_mongo_collection(db_collection, df_name, find_query=None, projection=None, batch_size=None):
+    """
+    Lấy dữ liệu từ collection MongoDB và trả về DataFrame
+
+    Parameters:
+    - batch_size: nếu có, đọc dữ liệu theo chế độ streaming (ưu tiên pymongoarrow nếu đã cài,
+      nếu không thì đọc cursor theo từng batch) để giảm bộ nhớ đỉnh với các collection lớn
+    """
     # Các tham số cho việc thử lại và timeout
     MAX_RETRIES = 3  # Số lần thử lại tối đa
     OPERATION_TIMEOUT_SECONDS = 30  # Thời gian timeout cho mỗi lần thử (giây)
     RETRY_DELAY_SECONDS = 1  # Thời gian chờ giữa các lần thử lại (giây)
 
     # Kiểm tra df_name có tồn tại trong db_collection không
-    if df_name not in db_collection.list_collection_names():
+    if not _collection_exists(db_collection, df_name):
         raise ValueError(f"Collection '{df_name}' không tồn tại trong database.")
 
     collection = db_collection[df_name]
@@ -40,11 +145,21 @@ def get_mongo_collection(db_collection, df_name, find_query=None, projection=Non
     last_exception = None
     for attempt in range(MAX_RETRIES):
         try:
+            # Chế độ streaming: decode trực tiếp sang Arrow nếu có pymongoarrow
+            if batch_size and find_pandas_all is not None:
+                return find_pandas_all(
+                    collection, find_query, projection=projection, max_time_ms=OPERATION_TIMEOUT_SECONDS * 1000, batch_size=batch_size
+                )
+
             # Thực hiện lệnh find với điều kiện, projection và max_time_ms
             # max_time_ms được áp dụng cho các hoạt động của cursor trên server MongoDB
             cursor = collection.find(find_query, projection)
             cursor.max_time_ms(OPERATION_TIMEOUT_SECONDS * 1000) # Chuyển đổi giây sang mili giây
 
+            # Chế độ streaming: chỉ giữ tối đa một batch document trong bộ nhớ
+            if batch_size:
+                return _cursor_to_dataframe(cursor, batch_size)
+
             # Dữ liệu thực sự được lấy khi chuyển cursor thành list
             # Đây là nơi ExecutionTimeout có thể xảy ra nếu server mất quá nhiều thời gian
             docs_list = list(cursor)
@@ -83,51 +198,251 @@ def get_mongo_collection(db_collection, df_name, find_query=None, projection=Non
     else:
         # Trường hợp này không nên xảy ra nếu có lỗi và đã được bắt lại
         raise RuntimeError(f"Không thể lấy dữ liệu cho '{df_name}' sau {MAX_RETRIES} lần thử (không rõ nguyên nhân).")
+
+
+def get_mongo_collections(request_dict, max_workers=8):
+    """
+    Lấy song song nhiều collection MongoDB, dùng chung connection pool của MongoClient
+
+    Parameters:
+    - request_dict: dict {tên kết quả: cấu hình}, mỗi cấu hình là dict gồm:
+        - db: database (stock_db, ref_db...)
+        - collection: tên collection
+        - find_query, projection (tùy chọn): giống get_mongo_collection
+        - batch_size (tùy chọn): chỉ dùng với mode 'default'
+        - mode (tùy chọn): 'default' (get_mongo_collection), 'cache' (get_cached_mongo_collection)
+          hoặc 'sync' (sync_mongo_collection)
+    - max_workers: số luồng tối đa chạy đồng thời
+
+    Returns:
+    - dict {tên kết quả: DataFrame}, raise RuntimeError nếu có collection bị lỗi
+    """
+    fetch_function_dict = {
+        "default": get_mongo_collection,
+        "cache": get_cached_mongo_collection,
+        "sync": sync_mongo_collection,
+    }
+
+    def fetch_one(config):
+        mode = config.get("mode", "default")
+        kwargs = {"find_query": config.get("find_query"), "projection": config.get("projection")}
+        if mode == "default" and config.get("batch_size"):
+            kwargs["batch_size"] = config["batch_size"]
+        return fetch_function_dict[mode](config["db"], config["collection"], **kwargs)
+
+    result_dict = {}
+    error_dict = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, max(len(request_dict), 1))) as executor:
+        future_dict = {executor.submit(fetch_one, config): name for name, config in request_dict.items()}
+        for future in as_completed(future_dict):
+            name = future_dict[future]
+            try:
+                result_dict[name] = future.result()
+            except Exception as e:
+                error_dict[name] = e
+
+    if error_dict:
+        error_message = "; ".join(f"{name}: {error}" for name, error in error_dict.items())
+        raise RuntimeError(f"Không thể lấy dữ liệu cho {len(error_dict)} collection. Lỗi: {error_message}")
+
+    # Giữ đúng thứ tự khai báo trong request_dict
+    return {name: result_dict[name] for name in request_dict}
+
+
+def get_mongo_last_n_days(db_collection, df_name_list, ticker_list, n_days, projection=None, change_periods=(1,), date_field="date"):
+    """
+    Lấy N ngày gần nhất của từng ticker bằng aggregation pipeline trên server (cần MongoDB >= 5.2),
+    thay cho việc tải cả collection rồi lọc theo ticker và head(N) bằng pandas
+
+    Parameters:
+    - db_collection: database (stock_db...)
+    - df_name_list: danh sách collection được gộp lại bằng $unionWith, ví dụ ['today_index', 'history_index'],
+      nếu một (ticker, ngày) có ở nhiều collection thì giữ dòng của collection đứng trước
+    - ticker_list: danh sách ticker cần lấy
+    - n_days: số ngày gần nhất cần giữ cho mỗi ticker
+    - projection: các cột cần lấy (dạng projection của find), mặc định lấy tất cả trừ _id
+    - change_periods: các kỳ tính '{p}d_change' (tương đương pct_change(p)), luôn tính thêm '1d_diff'
+    - date_field: cột ngày dùng để sắp xếp
+
+    Returns:
+    - DataFrame sắp xếp theo ticker, ngày giảm dần, đã có '1d_diff' và các cột '{p}d_change'
+    """
+    MAX_RETRIES = 3
+    OPERATION_TIMEOUT_SECONDS = 30
+    RETRY_DELAY_SECONDS = 1
+
+    for df_name in df_name_list:
+        if not _collection_exists(db_collection, df_name):
+            raise ValueError(f"Collection '{df_name}' không tồn tại trong database.")
+
+    change_periods = sorted(set(change_periods) | {1})
+    match_stage = {"$match": {"ticker": {"$in": list(ticker_list)}}}
+
+    # Mỗi collection được đánh số thứ tự ưu tiên (collection đứng trước trong df_name_list được ưu tiên)
+    pipeline = [match_stage, {"$addFields": {"_source_rank": 0}}]
+    for source_rank, df_name in enumerate(df_name_list[1:], start=1):
+        pipeline.append({"$unionWith": {"coll": df_name, "pipeline": [match_stage, {"$addFields": {"_source_rank": source_rank}}]}})
+
+    # 0. Các collection có thể cùng chứa một (ticker, ngày), ví dụ ngày hiện tại nằm ở cả today_index và history_index:
+    #    chỉ giữ dòng của collection được ưu tiên hơn
+    pipeline += [
+        {
+            "$group": {
+                "_id": {"ticker": "$ticker", "date": f"${date_field}"},
+                "row": {"$top": {"sortBy": {"_source_rank": 1}, "output": "$$ROOT"}},
+            }
+        },
+        {"$replaceRoot": {"newRoot": "$row"}},
+    ]
+
+    # 1. Chỉ giữ n_days + kỳ dài nhất cho mỗi ticker để đủ dữ liệu tính biến động
+    pipeline += [
+        {
+            "$group": {
+                "_id": "$ticker",
+                "rows": {"$topN": {"n": n_days + max(change_periods), "sortBy": {date_field: -1}, "output": "$$ROOT"}},
+            }
+        },
+        {"$unwind": "$rows"},
+        {"$replaceRoot": {"newRoot": "$rows"}},
+    ]
+
+    # 2. Tính 1d_diff và các {p}d_change trên server bằng $shift
+    pipeline.append({"$setWindowFields": {"partitionBy": "$ticker", "sortBy": {date_field: -1}, "output": {"_row_number": {"$documentNumber": {}}}}})
+    pipeline.append(
+        {
+            "$setWindowFields": {
+                "partitionBy": "$ticker",
+                "sortBy": {date_field: 1},
+                "output": {f"_prev_close_{p}": {"$shift": {"output": "$close", "by": -p}} for p in change_periods},
+            }
+        }
+    )
+    change_fields = {"1d_diff": {"$subtract": ["$close", {"$ifNull": ["$_prev_close_1", "$close"]}]}}
+    for p in change_periods:
+        prev_close = f"$_prev_close_{p}"
+        change_fields[f"{p}d_change"] = {
+            "$cond": [{"$gt": [{"$ifNull": [prev_close, 0]}, 0]}, {"$subtract": [{"$divide": ["$close", prev_close]}, 1]}, 0]
+        }
+    pipeline.append({"$addFields": change_fields})
+
+    # 3. Cắt về n_days và bỏ các cột phụ
+    pipeline.append({"$match": {"_row_number": {"$lte": n_days}}})
+    is_inclusion = projection and any(value for field, value in projection.items() if field != "_id")
+    if is_inclusion:
+        final_projection = {**projection, "_id": 0, **{field: 1 for field in change_fields}}
+    else:
+        final_projection = {
+            **(projection or {}),
+            "_id": 0,
+            "_row_number": 0,
+            "_source_rank": 0,
+            **{f"_prev_close_{p}": 0 for p in change_periods},
+        }
+    pipeline.append({"$project": final_projection})
+    pipeline.append({"$sort": {"ticker": 1, date_field: -1}})
+
+    last_exception = None
+    for attempt in range(MAX_RETRIES):
+        try:
+            cursor = db_collection[df_name_list[0]].aggregate(pipeline, maxTimeMS=OPERATION_TIMEOUT_SECONDS * 1000)
+            return pd.DataFrame(list(cursor))
+        except PyMongoError as e:
+            last_exception = e
+            print(f"Lỗi MongoDB khi aggregate '{df_name_list}' (lần thử {attempt + 1}/{MAX_RETRIES}). Lỗi: {e}")
+            if attempt < MAX_RETRIES - 1:
+                time.sleep(RETRY_DELAY_SECONDS)
+
+    raise RuntimeError(f"Không thể lấy dữ liệu cho '{df_name_list}' sau {MAX_RETRIES} lần thử. Lỗi cuối cùng: {last_exception}") from last_exception
     
-def overwrite_mongo_collection(collection, df):
+def _iter_record_chunks(df, chunk_size):
+    """Sinh lần lượt từng chunk records từ DataFrame, chỉ giữ một chunk dict trong bộ nhớ"""
+    for start in range(0, len(df), chunk_size):
+        chunk_df = df.iloc[start:start + chunk_size]
+        yield chunk_df.replace({pd.NaT: None}).to_dict(orient='records')
+
+
+def _insert_chunk_unordered(collection, records, is_retry=False):
+    """
+    insert_many không theo thứ tự.
+    is_retry=True khi ghi lại chunk đã bị ghi dở ở lần thử trước: bỏ qua lỗi trùng _id (11000) của các document đã ghi.
+    Lần ghi đầu tiên thì lỗi trùng _id là dữ liệu trùng thật nên vẫn raise.
+    """
+    try:
+        collection.insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        if not is_retry:
+            raise
+        other_errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if other_errors or e.details.get("writeConcernErrors"):
+            raise
+
+
+def overwrite_mongo_collection(collection, df, chunk_size=5000, write_concern=None):
+    """
+    Ghi đè toàn bộ collection bằng DataFrame thông qua collection tạm rồi đổi tên
+
+    Parameters:
+    - collection: collection MongoDB cần ghi đè
+    - df: pandas DataFrame cần lưu
+    - chunk_size: số document mỗi lần insert_many (ordered=False)
+    - write_concern: dict tham số WriteConcern cho collection tạm, ví dụ {"w": 1, "j": False}
+    """
     # Lấy tên collection hiện tại và database
     collection_name = collection.name
     db = collection.database  # Truy cập database từ collection
     temp_collection_name = f"temp_{collection_name}"
     old_collection_name = f"old_{collection_name}"
 
-    # Reset index của DataFrame
+    # Reset index của DataFrame và tạo sẵn _id để khi thử lại có thể ghi tiếp mà không bị trùng dữ liệu
     df_reset = df.reset_index(drop=True)
-    records = df_reset.replace({pd.NaT: None}).to_dict(orient='records')
+    if "_id" not in df_reset.columns:
+        df_reset.insert(0, "_id", [ObjectId() for _ in range(len(df_reset))])
 
     MAX_RETRIES = 3
     RETRY_DELAY_SECONDS = 1
     last_exception = None
+    inserted_rows = 0  # Số dòng đã ghi xong vào collection tạm, dùng để ghi tiếp khi thử lại
+    is_swapped = False  # Đã đổi tên collection tạm thành tên chuẩn, khi thử lại chỉ cần dọn 'old_'
 
     for attempt in range(MAX_RETRIES):
         try:
-            # 1. Lưu dữ liệu vào collection tạm
-            temp_collection = db[temp_collection_name]
-            temp_collection.drop()  # Đảm bảo collection tạm sạch trước khi insert
-            if records: # Ensure records is not empty before inserting
-                temp_collection.insert_many(records)
-
-            # 2. Rename collection cũ thành 'old_' (nếu tồn tại)
-            if collection_name in db.list_collection_names():
-                db[collection_name].rename(old_collection_name, dropTarget=True)
-
-            # 3. Rename collection tạm thành tên chuẩn
-            # Check if temp_collection exists before renaming, as it might have been dropped or not created if records were empty
-            if temp_collection_name in db.list_collection_names():
-                temp_collection.rename(collection_name, dropTarget=True)
-            elif not records and collection_name not in db.list_collection_names():
-                # If records were empty and original collection didn't exist, effectively we are creating an empty collection
-                pass # Or db.create_collection(collection_name) if explicit creation is desired
-            elif not records and collection_name in db.list_collection_names():
-                # If records were empty and original collection existed, it means we want to empty it.
-                # The old collection was renamed to old_collection_name, so the current state is an empty collection_name.
-                # This case is handled by the rename of old_collection_name and then its deletion.
-                pass
+            # Bước 1-3 chỉ chạy khi chưa đổi tên xong, tránh đổi tên dữ liệu mới thành 'old_' khi thử lại
+            if not is_swapped:
+                # 1. Lưu dữ liệu vào collection tạm theo từng chunk
+                temp_collection = db[temp_collection_name]
+                if write_concern:
+                    temp_collection = temp_collection.with_options(write_concern=WriteConcern(**write_concern))
+                if inserted_rows == 0:
+                    temp_collection.drop()  # Đảm bảo collection tạm sạch trước khi insert
+                    _update_collection_name_cache(db, removed=[temp_collection_name])
+                # Chỉ chunk đầu tiên của lần thử lại có thể đã được ghi một phần ở lần thử trước
+                is_resumed_chunk = attempt > 0 and inserted_rows > 0
+                for records in _iter_record_chunks(df_reset.iloc[inserted_rows:], chunk_size):
+                    _insert_chunk_unordered(temp_collection, records, is_retry=is_resumed_chunk)
+                    is_resumed_chunk = False
+                    inserted_rows += len(records)
+                    _update_collection_name_cache(db, added=[temp_collection_name])
 
+                # 2. Rename collection cũ thành 'old_' (nếu tồn tại)
+                if _collection_exists(db, collection_name):
+                    db[collection_name].rename(old_collection_name, dropTarget=True)
+                    _update_collection_name_cache(db, added=[old_collection_name], removed=[collection_name])
+
+                # 3. Rename collection tạm thành tên chuẩn
+                # Check if temp_collection exists before renaming, as it might have been dropped or not created if records were empty
+                # Cache đã được cập nhật theo các bước trên nên không cần hỏi lại server
+                if _collection_exists(db, temp_collection_name, refresh_on_miss=False):
+                    temp_collection.rename(collection_name, dropTarget=True)
+                    _update_collection_name_cache(db, added=[collection_name], removed=[temp_collection_name])
+                is_swapped = True
+                # If records were empty, the old collection was renamed to old_collection_name,
+                # so the current state is an empty (non-existent) collection_name after step 4.
 
             # 4. Xóa collection 'old_' (nếu tồn tại)
-            if old_collection_name in db.list_collection_names():
+            if _collection_exists(db, old_collection_name, refresh_on_miss=False):
                 db[old_collection_name].drop()
+                _update_collection_name_cache(db, removed=[old_collection_name])
             
             return  # Exit if successful
 
@@ -137,13 +452,156 @@ def overwrite_mongo_collection(collection, df):
             if attempt < MAX_RETRIES - 1:
                 print(f"Retrying in {RETRY_DELAY_SECONDS} seconds...")
                 time.sleep(RETRY_DELAY_SECONDS)
+                # Cache tên collection có thể đã sai (ví dụ rename thất bại), lấy lại từ server trước khi thử lại
+                try:
+                    _get_collection_names(db, refresh=True)
+                except PyMongoError as refresh_error:
+                    print(f"Không thể làm mới danh sách collection: {refresh_error}")
             else:
                 print(f"Failed to overwrite collection '{collection_name}' after {MAX_RETRIES} attempts.")
     
     if last_exception:
         raise RuntimeError(f"Failed to overwrite collection '{collection_name}' after {MAX_RETRIES} attempts. Last error: {last_exception}") from last_exception
 
-def save_to_mssql(engine, df, table_name, if_exists='replace', index=False, max_retries=5):
+
+_fast_executemany_engine_dict = {}  # {engine gốc: engine riêng bật fast_executemany}
+_fast_executemany_engine_lock = threading.Lock()
+
+
+def _get_fast_executemany_engine(engine):
+    """
+    Engine riêng (tạo một lần, dùng lại) bật fast_executemany của pyodbc cho cùng URL,
+    để các lệnh ghi không truyền fast=True trên engine gốc không bị ảnh hưởng.
+    Trả về None nếu engine không phải mssql+pyodbc.
+    """
+    if engine.dialect.name != "mssql" or engine.driver != "pyodbc":
+        return None
+    with _fast_executemany_engine_lock:
+        if engine not in _fast_executemany_engine_dict:
+            _fast_executemany_engine_dict[engine] = create_engine(engine.url, fast_executemany=True)
+        return _fast_executemany_engine_dict[engine]
+
+
+def _swap_staging_table(engine, staging_table_name, table_name):
+    """Thay bảng chính bằng bảng staging trong một transaction để người đọc không thấy bảng ghi dở"""
+    with engine.begin() as conn:
+        if engine.dialect.name == "mssql":
+            conn.execute(text(f"IF OBJECT_ID(N'{table_name}', N'U') IS NOT NULL DROP TABLE [{table_name}]"))
+            conn.execute(text(f"EXEC sp_rename N'{staging_table_name}', N'{table_name}'"))
+        else:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+            conn.execute(text(f"ALTER TABLE {staging_table_name} RENAME TO {table_name}"))
+
+
+def _mssql_fingerprint_path(engine, table_name):
+    """Đường dẫn file lưu hash các dòng đã ghi lần trước của một bảng"""
+    engine_hash = hashlib.md5(str(engine.url).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(MSSQL_CACHE_DIR, f"{engine_hash}.{table_name}.parquet")
+
+
+def _build_mssql_fingerprint(df, key_columns):
+    """Tạo bảng gồm các cột khóa và hash của toàn bộ dòng"""
+    fingerprint_df = df[key_columns].copy()
+    fingerprint_df["_row_hash"] = pd.util.hash_pandas_object(df, index=False).values
+    return fingerprint_df.reset_index(drop=True)
+
+
+def _get_mssql_schema(df):
+    """Tên cột và kiểu dữ liệu của DataFrame, dùng để phát hiện bảng đổi cấu trúc"""
+    return [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+
+
+def _save_mssql_fingerprint(fingerprint_path, fingerprint_df, schema):
+    """Lưu dấu vân tay kèm cấu trúc bảng vào metadata của file parquet"""
+    os.makedirs(MSSQL_CACHE_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(fingerprint_df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), MSSQL_FINGERPRINT_SCHEMA_KEY: json.dumps(schema).encode("utf-8")}
+    pq.write_table(table.replace_schema_metadata(metadata), fingerprint_path)
+
+
+def _load_mssql_fingerprint(fingerprint_path):
+    """Đọc dấu vân tay và cấu trúc bảng đã lưu, cấu trúc là None nếu file cũ chưa có metadata"""
+    table = pq.read_table(fingerprint_path)
+    schema_bytes = (table.schema.metadata or {}).get(MSSQL_FINGERPRINT_SCHEMA_KEY)
+    return table.to_pandas(), json.loads(schema_bytes) if schema_bytes else None
+
+
+def _upsert_to_mssql(engine, df, table_name, key_columns, index=False):
+    """
+    Chỉ ghi các dòng thêm mới, thay đổi hoặc bị xóa so với lần ghi trước bằng MERGE.
+    Ghi lại toàn bộ bảng nếu chưa có dấu vân tay, cấu trúc cột/kiểu dữ liệu đã thay đổi
+    hoặc số dòng trên server không khớp.
+    """
+    df = df.reset_index() if index else df.reset_index(drop=True)
+    # MERGE so khớp bằng "=", NULL không bao giờ khớp nên dòng có khóa rỗng sẽ bị INSERT lặp lại mỗi lần ghi
+    if df[key_columns].isna().any().any():
+        raise ValueError(f"Các cột khóa {key_columns} có giá trị rỗng, không thể upsert vào bảng '{table_name}'.")
+    fingerprint_path = _mssql_fingerprint_path(engine, table_name)
+    new_fingerprint_df = _build_mssql_fingerprint(df, key_columns)
+    new_schema = _get_mssql_schema(df)
+
+    old_fingerprint_df = None
+    if os.path.exists(fingerprint_path):
+        try:
+            old_fingerprint_df, old_schema = _load_mssql_fingerprint(fingerprint_path)
+            if old_schema != new_schema:
+                # Thêm/bớt cột hoặc đổi kiểu dữ liệu: MERGE sẽ tham chiếu cột mà bảng đích không có
+                print(f"Cấu trúc bảng '{table_name}' đã thay đổi, ghi lại toàn bộ.")
+                old_fingerprint_df = None
+            else:
+                with engine.connect() as conn:
+                    server_count = conn.execute(text(f"SELECT COUNT(*) FROM [{table_name}]")).scalar()
+                if server_count != len(old_fingerprint_df):
+                    old_fingerprint_df = None
+        except Exception as e:
+            print(f"Không thể dùng dấu vân tay của bảng '{table_name}', ghi lại toàn bộ. Lỗi: {e}")
+            old_fingerprint_df = None
+
+    if old_fingerprint_df is None:
+        df.to_sql(table_name, engine, if_exists="replace", index=False)
+    else:
+        compare_df = new_fingerprint_df.merge(old_fingerprint_df, on=key_columns, how="outer", suffixes=("", "_old"), indicator=True)
+        changed_mask = (compare_df["_merge"] == "left_only") | (
+            (compare_df["_merge"] == "both") & (compare_df["_row_hash"] != compare_df["_row_hash_old"])
+        )
+        upsert_keys = compare_df.loc[changed_mask, key_columns]
+        deleted_keys = compare_df.loc[compare_df["_merge"] == "right_only", key_columns]
+
+        if upsert_keys.empty and deleted_keys.empty:
+            return
+
+        # Bảng staging gồm các dòng cần thêm/sửa và các khóa cần xóa (đánh dấu _deleted = 1)
+        upsert_rows = df.merge(upsert_keys, on=key_columns, how="inner")
+        upsert_rows["_deleted"] = 0
+        deleted_keys = deleted_keys.copy()
+        deleted_keys["_deleted"] = 1
+        staging_df = pd.concat([upsert_rows, deleted_keys], axis=0, ignore_index=True)[list(df.columns) + ["_deleted"]]
+        staging_table_name = f"{table_name}_upsert_staging"
+        staging_df.to_sql(staging_table_name, engine, if_exists="replace", index=False)
+
+        value_columns = [col for col in df.columns if col not in key_columns]
+        on_clause = " AND ".join(f"t.[{col}] = s.[{col}]" for col in key_columns)
+        all_columns = ", ".join(f"[{col}]" for col in df.columns)
+        source_columns = ", ".join(f"s.[{col}]" for col in df.columns)
+        merge_sql = (
+            f"MERGE [{table_name}] AS t USING [{staging_table_name}] AS s ON {on_clause} "
+            f"WHEN MATCHED AND s.[_deleted] = 1 THEN DELETE "
+        )
+        if value_columns:
+            update_clause = ", ".join(f"t.[{col}] = s.[{col}]" for col in value_columns)
+            merge_sql += f"WHEN MATCHED THEN UPDATE SET {update_clause} "
+        merge_sql += f"WHEN NOT MATCHED BY TARGET AND s.[_deleted] = 0 THEN INSERT ({all_columns}) VALUES ({source_columns});"
+
+        with engine.begin() as conn:
+            conn.execute(text(merge_sql))
+            conn.execute(text(f"DROP TABLE [{staging_table_name}]"))
+
+    _save_mssql_fingerprint(fingerprint_path, new_fingerprint_df, new_schema)
+
+
+def save_to_mssql(
+    engine, df, table_name, if_exists='replace', index=False, max_retries=5, fast=False, chunksize=None, use_staging=False, key_columns=None
+):
     """
     Lưu DataFrame vào SQL với cơ chế thử lại khi gặp lỗi
     
@@ -151,22 +609,278 @@ def save_to_mssql(engine, df, table_name, if_exists='replace', index=False, max_
     - df: pandas DataFrame cần lưu
     - engine: SQLAlchemy engine
     - table_name: tên bảng trong database
-    - if_exists: hành động khi bảng đã tồn tại ('replace', 'append', 'fail')
+    - if_exists: hành động khi bảng đã tồn tại ('replace', 'append', 'fail', 'upsert')
+      'upsert' chỉ ghi các dòng thêm mới/thay đổi/bị xóa so với lần ghi trước bằng MERGE (cần key_columns)
     - index: có lưu index hay không
     - max_retries: số lần thử lại tối đa
-    - retry_delay: thời gian chờ giữa các lần thử (giây)
+    - fast: ghi nhanh bằng pyodbc fast_executemany (mssql+pyodbc),
+      engine khác thì dùng insert nhiều dòng trong một câu lệnh (method='multi')
+    - chunksize: số dòng mỗi lần ghi, mặc định tự tính khi fast=True
+    - use_staging: ghi vào bảng '{table_name}_staging' rồi đổi tên thành bảng chính (chỉ dùng với if_exists='replace')
+    - key_columns: danh sách cột khóa xác định một dòng, bắt buộc khi if_exists='upsert'
     
     Returns:
     - True nếu thành công, raise exception nếu thất bại sau tất cả lần thử
     """
+    if if_exists == 'upsert':
+        if not key_columns:
+            raise ValueError("Cần truyền key_columns khi dùng if_exists='upsert'.")
+        if engine.dialect.name != "mssql":
+            raise ValueError("Chế độ upsert chỉ hỗ trợ SQL Server (MERGE).")
+        # Kiểm tra trước vòng thử lại vì lỗi này không thể tự hết khi thử lại
+        key_df = df.reset_index() if index else df
+        if key_df[key_columns].duplicated().any():
+            raise ValueError(f"Các cột khóa {key_columns} bị trùng lặp, không thể upsert vào bảng '{table_name}'.")
+
+    to_sql_kwargs = {"index": index, "chunksize": chunksize}
+    write_engine = engine
+    if fast:
+        fast_engine = _get_fast_executemany_engine(engine)
+        if fast_engine is not None:
+            write_engine = fast_engine
+            to_sql_kwargs["chunksize"] = chunksize or 10000
+        else:
+            # SQL Server giới hạn 2100 tham số cho mỗi câu lệnh
+            num_columns = len(df.columns) + (1 if index else 0)
+            to_sql_kwargs["method"] = "multi"
+            to_sql_kwargs["chunksize"] = chunksize or max(1, 2000 // max(num_columns, 1))
+
+    use_staging = use_staging and if_exists == 'replace'
+    write_table_name = f"{table_name}_staging" if use_staging else table_name
+
     last_exception = None
     for _ in range(max_retries):
         try:
-            df.to_sql(table_name, engine, if_exists=if_exists, index=index)
+            if if_exists == 'upsert':
+                _upsert_to_mssql(engine, df, table_name, key_columns, index=index)
+                return True
+
+            df.to_sql(write_table_name, write_engine, if_exists=if_exists, **to_sql_kwargs)
+            if use_staging:
+                _swap_staging_table(engine, write_table_name, table_name)
+
+            # Bảng đã được ghi theo cách khác nên dấu vân tay upsert cũ không còn đúng
+            fingerprint_path = _mssql_fingerprint_path(engine, table_name)
+            if os.path.exists(fingerprint_path):
+                os.remove(fingerprint_path)
             return True
+        except ValueError:
+            # Lỗi dữ liệu đầu vào (sai cột, sai tham số...) thì thử lại cũng không thành công
+            raise
         except Exception as e:
             last_exception = e
     
     # Nếu tất cả các lần thử đều thất bại
     if last_exception:
-        raise RuntimeError(f"Không thể lưu dữ liệu vào bảng '{table_name}'. Lỗi: {last_exception}") from last_exception
\ No newline at end of file
+        raise RuntimeError(f"Không thể lưu dữ liệu vào bảng '{table_name}'. Lỗi: {last_exception}") from last_exception
+
+
+# Hàng đợi ghi SQL chạy nền: các bảng khác nhau được ghi song song qua connection pool của engine
+MSSQL_WRITE_MAX_WORKERS = 4
+_mssql_write_executor = None
+_mssql_write_futures = []  # [(tên bảng, future)]
+_mssql_write_lock = threading.Lock()
+
+
+def enqueue_save_to_mssql(engine, df, table_name, **kwargs):
+    """
+    Đưa một lệnh save_to_mssql vào hàng đợi ghi nền và trả về ngay,
+    cần gọi flush_mssql_writes() ở cuối notebook để chờ tất cả hoàn tất
+
+    Parameters:
+    - engine, df, table_name, **kwargs: giống save_to_mssql
+    """
+    global _mssql_write_executor
+    with _mssql_write_lock:
+        if _mssql_write_executor is None:
+            _mssql_write_executor = ThreadPoolExecutor(max_workers=MSSQL_WRITE_MAX_WORKERS)
+        # Sao chép df để các thay đổi sau khi enqueue không ảnh hưởng dữ liệu đang ghi
+        future = _mssql_write_executor.submit(save_to_mssql, engine, df.copy(), table_name, **kwargs)
+        _mssql_write_futures.append((table_name, future))
+    return future
+
+
+def flush_mssql_writes():
+    """
+    Chờ tất cả các lệnh ghi trong hàng đợi hoàn tất
+
+    Returns:
+    - dict {tên bảng: True} nếu thành công, raise RuntimeError liệt kê từng bảng bị lỗi nếu có
+    """
+    with _mssql_write_lock:
+        pending_futures = list(_mssql_write_futures)
+        _mssql_write_futures.clear()
+
+    result_dict = {}
+    error_dict = {}
+    for table_name, future in pending_futures:
+        try:
+            result_dict[table_name] = future.result()
+        except Exception as e:
+            error_dict[table_name] = e
+            print(f"❌ Lỗi khi ghi bảng '{table_name}': {e}")
+
+    if error_dict:
+        error_message = "; ".join(f"{table_name}: {error}" for table_name, error in error_dict.items())
+        raise RuntimeError(f"Không thể lưu {len(error_dict)}/{len(pending_futures)} bảng. Lỗi: {error_message}")
+    return result_dict
+
+
+# Các hàm cache cục bộ cho dữ liệu MongoDB
+def _mongo_cache_key(db_collection, df_name, find_query=None, projection=None):
+    """Tạo khóa cache duy nhất từ database, collection, query và projection"""
+    key_source = json.dumps(
+        {"db": db_collection.name, "collection": df_name, "query": find_query or {}, "projection": projection or {"_id": 0}},
+        sort_keys=True,
+        default=str,
+    )
+    return f"{db_collection.name}.{df_name}.{hashlib.md5(key_source.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _read_mongo_cache(cache_key):
+    """Đọc DataFrame và metadata từ cache, trả về (None, None) nếu không có hoặc bị lỗi"""
+    data_path = os.path.join(MONGO_CACHE_DIR, f"{cache_key}.parquet")
+    meta_path = os.path.join(MONGO_CACHE_DIR, f"{cache_key}.json")
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None, None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return pd.read_parquet(data_path), meta
+    except Exception as e:
+        print(f"Không thể đọc cache '{cache_key}': {e}")
+        return None, None
+
+
+def _write_mongo_cache(cache_key, df, meta):
+    """Ghi DataFrame và metadata ra cache (ghi file tạm rồi đổi tên để tránh file hỏng)"""
+    os.makedirs(MONGO_CACHE_DIR, exist_ok=True)
+    data_path = os.path.join(MONGO_CACHE_DIR, f"{cache_key}.parquet")
+    meta_path = os.path.join(MONGO_CACHE_DIR, f"{cache_key}.json")
+    try:
+        df.to_parquet(f"{data_path}.tmp", index=False)
+        os.replace(f"{data_path}.tmp", data_path)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, default=str)
+        os.replace(f"{meta_path}.tmp", meta_path)
+    except Exception as e:
+        print(f"Không thể ghi cache '{cache_key}': {e}")
+
+
+def _get_mongo_fingerprint(collection, find_query=None, date_field="date"):
+    """Lấy dấu hiệu thay đổi rẻ của collection: số document và giá trị date lớn nhất"""
+    find_query = find_query or {}
+    count = collection.count_documents(find_query)
+    last_doc = collection.find_one(find_query, {"_id": 0, date_field: 1}, sort=[(date_field, -1)])
+    max_date = last_doc.get(date_field) if last_doc else None
+    return {"count": count, "max_date": str(max_date) if max_date is not None else None}
+
+
+def get_cached_mongo_collection(db_collection, df_name, find_query=None, projection=None, ttl_seconds=None, date_field="date"):
+    """
+    Lấy dữ liệu collection qua cache Parquet cục bộ, dùng cho các collection tham chiếu
+    (date_series, time_series, name_map, full_stock_classification...)
+
+    Parameters:
+    - db_collection, df_name, find_query, projection: giống get_mongo_collection
+    - ttl_seconds: tuổi tối đa của cache, quá hạn sẽ tải lại toàn bộ (mặc định MONGO_CACHE_TTL_SECONDS)
+    - date_field: cột dùng để kiểm tra dữ liệu mới (max date)
+
+    Returns:
+    - DataFrame, lấy từ cache nếu số document và max date trên server không đổi
+    """
+    if ttl_seconds is None:
+        ttl_seconds = MONGO_CACHE_TTL_SECONDS
+
+    cache_key = _mongo_cache_key(db_collection, df_name, find_query, projection)
+    cached_df, meta = _read_mongo_cache(cache_key)
+
+    fingerprint = None
+    try:
+        fingerprint = _get_mongo_fingerprint(db_collection[df_name], find_query, date_field)
+    except PyMongoError as e:
+        print(f"Không thể kiểm tra dữ liệu mới cho '{df_name}': {e}")
+
+    if cached_df is not None:
+        is_expired = time.time() - meta.get("created_at", 0) > ttl_seconds
+        is_fresh = fingerprint is None or (fingerprint["count"] == meta.get("count") and fingerprint["max_date"] == meta.get("max_date"))
+        if not is_expired and is_fresh:
+            return cached_df
+
+    df = get_mongo_collection(db_collection, df_name, find_query=find_query, projection=projection)
+    if fingerprint is not None:
+        _write_mongo_cache(cache_key, df, {"created_at": time.time(), **fingerprint})
+    return df
+
+
+def clear_mongo_cache(df_name=None):
+    """Xóa cache cục bộ, của một collection cụ thể hoặc toàn bộ nếu df_name là None"""
+    if not os.path.exists(MONGO_CACHE_DIR):
+        return
+    for file_name in os.listdir(MONGO_CACHE_DIR):
+        if df_name is None or file_name.split(".")[1] == df_name:
+            os.remove(os.path.join(MONGO_CACHE_DIR, file_name))
+
+
+def _get_rows_content_hash(df):
+    """Hash nội dung các dòng, không phụ thuộc thứ tự dòng và thứ tự cột"""
+    if df.empty:
+        return 0
+    row_hashes = pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).values
+    return hashlib.md5(np.sort(row_hashes).tobytes()).hexdigest()
+
+
+def sync_mongo_collection(db_collection, df_name, find_query=None, projection=None, date_field="date", ttl_seconds=None):
+    """
+    Đồng bộ tăng dần một collection lịch sử (history_index, history_stock...) về bản sao cục bộ:
+    - Tải lại MONGO_SYNC_RECHECK_DAYS ngày gần nhất cùng các document mới, thay phần tương ứng của bản cục bộ
+      (nhận được cả các dòng gần đây bị sửa, ví dụ giá đóng cửa được điều chỉnh)
+    - Tải lại toàn bộ nếu số document cũ hơn khác bản cục bộ hoặc lần tải toàn bộ gần nhất đã quá ttl_seconds
+
+    Parameters:
+    - db_collection, df_name, find_query, projection: giống get_mongo_collection
+    - date_field: cột ngày dùng để xác định phần dữ liệu mới
+    - ttl_seconds: tuổi tối đa của lần tải toàn bộ gần nhất (mặc định MONGO_CACHE_TTL_SECONDS)
+
+    Returns:
+    - DataFrame đầy đủ (bản sao cục bộ đã được cập nhật)
+    """
+    if ttl_seconds is None:
+        ttl_seconds = MONGO_CACHE_TTL_SECONDS
+    find_query = find_query or {}
+    cache_key = _mongo_cache_key(db_collection, df_name, find_query, projection)
+    local_df, meta = _read_mongo_cache(cache_key)
+
+    can_sync = local_df is not None and not local_df.empty and date_field in local_df.columns
+    if can_sync and time.time() - meta.get("created_at", 0) > ttl_seconds:
+        # created_at là thời điểm tải toàn bộ gần nhất, các lần đồng bộ tăng dần không làm mới giá trị này
+        print(f"Bản sao cục bộ của '{df_name}' đã quá hạn, tải lại toàn bộ.")
+        can_sync = False
+
+    if can_sync and pd.api.types.is_datetime64_any_dtype(local_df[date_field]):
+        recheck_start = (local_df[date_field].max() - pd.Timedelta(days=MONGO_SYNC_RECHECK_DAYS)).to_pydatetime()
+        is_recent = local_df[date_field] >= recheck_start
+        try:
+            # Nếu số document cũ trên server khác bản cục bộ (bị sửa/xóa), cần tải lại toàn bộ
+            old_query = {"$and": [find_query, {date_field: {"$lt": recheck_start}}]}
+            if db_collection[df_name].count_documents(old_query) == int((~is_recent).sum()):
+                recent_query = {"$and": [find_query, {date_field: {"$gte": recheck_start}}]}
+                recent_df = get_mongo_collection(db_collection, df_name, find_query=recent_query, projection=projection)
+                if _get_rows_content_hash(recent_df) != _get_rows_content_hash(local_df[is_recent]):
+                    # Dữ liệu gần đây được đặt lên đầu để giữ thứ tự ngày giảm dần như trên server
+                    recent_df = recent_df.sort_values(date_field, ascending=False)
+                    local_df = pd.concat([recent_df, local_df[~is_recent]], axis=0, ignore_index=True)
+                    _write_mongo_cache(
+                        cache_key,
+                        local_df,
+                        {"created_at": meta.get("created_at", time.time()), "count": len(local_df), "max_date": str(local_df[date_field].max())},
+                    )
+                return local_df
+            print(f"Bản sao cục bộ của '{df_name}' không khớp với server, tải lại toàn bộ.")
+        except PyMongoError as e:
+            print(f"Không thể đồng bộ tăng dần '{df_name}': {e}")
+
+    full_df = get_mongo_collection(db_collection, df_name, find_query=find_query, projection=projection)
+    if not full_df.empty and date_field in full_df.columns:
+        _write_mongo_cache(cache_key, full_df, {"created_at": time.time(), "count": len(full_df), "max_date": str(full_df[date_field].max())})
+    return full_df
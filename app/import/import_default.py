@@ -8,6 +8,11 @@ import sys
 import copy
 import time
 import random
+import threading
+import sqlite3
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import timedelta, datetime, timezone
 from typing import cast, Dict, Optional
 import math
@@ -27,7 +32,7 @@ import io
 import re
 import hashlib
 import urllib3
-from urllib.parse import urlparse, quote
+from urllib.parse import urlparse, quote, urlencode, parse_qsl
 import hmac
 from pathlib import Path
 import glob
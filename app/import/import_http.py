@@ -0,0 +1,196 @@
+import sys
+import os
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "import"))
+from import_default import *
+
+
+# ==============================================================================
+# CẤU HÌNH HTTP CLIENT DÙNG CHUNG (CRAWLER, WICHART...)
+# ==============================================================================
+HTTP_MAX_CONCURRENCY_PER_HOST = 4  # Số request đồng thời tối đa tới cùng một host
+HTTP_RATE_PER_HOST = 5.0  # Số request/giây trung bình cho mỗi host (token bucket)
+HTTP_BURST_PER_HOST = 10  # Số request được phép dồn một lúc cho mỗi host
+HTTP_MAX_RETRIES = 3  # Số lần thử tối đa cho mỗi request
+HTTP_BACKOFF_BASE_SECONDS = 0.5  # Thời gian chờ cơ sở, tăng gấp đôi sau mỗi lần thử
+HTTP_BACKOFF_MAX_SECONDS = 8  # Thời gian chờ tối đa giữa hai lần thử
+HTTP_CIRCUIT_FAILURE_THRESHOLD = 5  # Số lỗi liên tiếp để tạm ngắt một host
+HTTP_CIRCUIT_COOLDOWN_SECONDS = 60  # Thời gian tạm ngắt host trước khi cho thử lại
+HTTP_RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Host đang bị tạm ngắt do lỗi liên tiếp"""
+
+
+class CrawlDeadlineExceeded(requests.exceptions.RequestException):
+    """Đã hết thời gian cho phép của phiên crawl"""
+
+
+_http_thread_local = threading.local()
+_host_state_dict = {}
+_host_state_lock = threading.Lock()
+_http_replay_base_url = None
+
+
+def _get_http_session():
+    """Mỗi luồng dùng một requests.Session riêng để tái sử dụng kết nối keep-alive"""
+    session = getattr(_http_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=HTTP_MAX_CONCURRENCY_PER_HOST)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_thread_local.session = session
+    return session
+
+
+def _get_host_state(host):
+    """Trạng thái của một host: semaphore, token bucket và circuit breaker"""
+    with _host_state_lock:
+        if host not in _host_state_dict:
+            _host_state_dict[host] = {
+                "semaphore": threading.BoundedSemaphore(HTTP_MAX_CONCURRENCY_PER_HOST),
+                "tokens": float(HTTP_BURST_PER_HOST),
+                "last_refill": time.monotonic(),
+                "failures": 0,
+                "open_until": 0.0,
+            }
+        return _host_state_dict[host]
+
+
+def set_http_replay_server(base_url):
+    """
+    Chuyển mọi request sang server phát lại cục bộ (dùng cho benchmark crawler), truyền None để tắt
+    URL gốc https://host/path?query được gửi tới {base_url}/host/path?query, giới hạn tốc độ vẫn tính theo host gốc
+    """
+    global _http_replay_base_url
+    _http_replay_base_url = base_url.rstrip("/") if base_url else None
+
+
+def _get_request_url(url):
+    """URL thực sự được gửi đi, đã đổi sang server phát lại nếu có"""
+    if not _http_replay_base_url:
+        return url
+    parsed = urlparse(url)
+    return f"{_http_replay_base_url}/{parsed.netloc.lower()}{parsed.path}" + (f"?{parsed.query}" if parsed.query else "")
+
+
+def get_crawl_deadline(seconds):
+    """Mốc hạn chót (theo time.monotonic) sau seconds giây kể từ bây giờ, None nếu không giới hạn"""
+    return time.monotonic() + seconds if seconds else None
+
+
+def call_with_crawl_deadline(deadline, func, *args, **kwargs):
+    """
+    Chạy func với hạn chót deadline cho mọi http_get trong luồng hiện tại (dùng khi submit vào ThreadPoolExecutor).
+    Hạn chót lưu theo luồng nên các phiên crawl chạy song song không ghi đè lên nhau.
+    """
+    previous_deadline = getattr(_http_thread_local, "deadline", None)
+    _http_thread_local.deadline = deadline
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _http_thread_local.deadline = previous_deadline
+
+
+def _get_remaining_seconds(deadline):
+    """Số giây còn lại trước hạn chót, None nếu không giới hạn"""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise CrawlDeadlineExceeded("Đã hết thời gian cho phép của phiên crawl.")
+    return remaining
+
+
+def _sleep_within_deadline(seconds, deadline):
+    """Ngủ nhưng không vượt quá hạn chót"""
+    remaining = _get_remaining_seconds(deadline)
+    if remaining is not None and seconds >= remaining:
+        raise CrawlDeadlineExceeded("Đã hết thời gian cho phép của phiên crawl.")
+    time.sleep(seconds)
+
+
+def _acquire_rate_token(host_state, deadline):
+    """Chờ đến khi token bucket của host còn token"""
+    while True:
+        with _host_state_lock:
+            now = time.monotonic()
+            elapsed = now - host_state["last_refill"]
+            host_state["tokens"] = min(HTTP_BURST_PER_HOST, host_state["tokens"] + elapsed * HTTP_RATE_PER_HOST)
+            host_state["last_refill"] = now
+            if host_state["tokens"] >= 1:
+                host_state["tokens"] -= 1
+                return
+            wait_seconds = (1 - host_state["tokens"]) / HTTP_RATE_PER_HOST
+        _sleep_within_deadline(wait_seconds, deadline)
+
+
+def _record_host_result(host, host_state, success):
+    """Cập nhật circuit breaker sau mỗi request"""
+    with _host_state_lock:
+        if success:
+            host_state["failures"] = 0
+            return
+        host_state["failures"] += 1
+        if host_state["failures"] >= HTTP_CIRCUIT_FAILURE_THRESHOLD:
+            host_state["open_until"] = time.monotonic() + HTTP_CIRCUIT_COOLDOWN_SECONDS
+            host_state["failures"] = 0
+            print(f"⚠️ Tạm ngắt host '{host}' trong {HTTP_CIRCUIT_COOLDOWN_SECONDS}s do lỗi liên tiếp.")
+
+
+def _get_backoff_seconds(attempt, response=None):
+    """Exponential backoff có jitter, ưu tiên header Retry-After nếu server trả về"""
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), HTTP_BACKOFF_MAX_SECONDS)
+    backoff = min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * (2**attempt))
+    return random.uniform(0, backoff)
+
+
+def http_get(url, headers=None, timeout=10, max_retries=HTTP_MAX_RETRIES, deadline=None, **kwargs):
+    """
+    GET dùng chung cho các hàm crawl/gọi API với:
+    - Session keep-alive theo luồng và giới hạn số kết nối đồng thời mỗi host
+    - Token bucket giới hạn tốc độ request mỗi host
+    - Thử lại với exponential backoff + jitter cho lỗi kết nối, timeout và mã 429/5xx
+    - Circuit breaker tạm ngắt host lỗi liên tiếp
+    - Hạn chót deadline (mốc time.monotonic), mặc định lấy hạn chót của luồng đặt bởi call_with_crawl_deadline
+
+    Returns:
+    - requests.Response (có thể là response lỗi ở lần thử cuối, người gọi tự raise_for_status)
+    """
+    if deadline is None:
+        deadline = getattr(_http_thread_local, "deadline", None)
+    host = urlparse(url).netloc
+    host_state = _get_host_state(host)
+    last_exception = None
+
+    for attempt in range(max_retries):
+        remaining = _get_remaining_seconds(deadline)
+        if host_state["open_until"] > time.monotonic():
+            raise CircuitOpenError(f"Host '{host}' đang bị tạm ngắt do lỗi liên tiếp.")
+        _acquire_rate_token(host_state, deadline)
+
+        request_timeout = min(timeout, remaining) if remaining is not None else timeout
+        try:
+            with host_state["semaphore"]:
+                response = _get_http_session().get(_get_request_url(url), headers=headers, timeout=request_timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            last_exception = e
+            _record_host_result(host, host_state, success=False)
+            if attempt < max_retries - 1:
+                _sleep_within_deadline(_get_backoff_seconds(attempt), deadline)
+            continue
+
+        if response.status_code in HTTP_RETRY_STATUS_CODES:
+            _record_host_result(host, host_state, success=False)
+            if attempt < max_retries - 1:
+                _sleep_within_deadline(_get_backoff_seconds(attempt, response), deadline)
+                continue
+        else:
+            _record_host_result(host, host_state, success=True)
+        return response
+
+    raise last_exception
@@ -0,0 +1,202 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "import"))
+from import_default import *
+
+import plotly.io as pio
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ==============================================================================
+# CẤU HÌNH RENDER SERVER (KALEIDO) DÙNG CHUNG CHO CÁC NOTEBOOK
+# ==============================================================================
+RENDER_SERVER_HOST = "127.0.0.1"
+RENDER_SERVER_PORT = 8765
+RENDER_SERVER_URL = f"http://{RENDER_SERVER_HOST}:{RENDER_SERVER_PORT}"
+RENDER_SERVER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))  # Số tiến trình Kaleido chạy song song
+RENDER_TIMEOUT_SECONDS = 120  # Thời gian tối đa cho một lần render
+RENDER_SERVER_RECHECK_SECONDS = 30  # Khoảng thời gian kiểm tra lại khi server không phản hồi
+
+_render_thread_local = threading.local()
+_render_server_state = {"available": None, "checked_at": 0.0}
+
+
+# ==============================================================================
+# PHÍA SERVER: POOL TIẾN TRÌNH KALEIDO LUÔN SẴN SÀNG
+# ==============================================================================
+def _warm_up_render_worker():
+    """Khởi động Chromium của Kaleido ngay khi tạo tiến trình để lần render đầu không phải chờ"""
+    # Kaleido >= 1.0 giữ một phiên Chromium mở trong tiến trình nếu hỗ trợ start_sync_server
+    if hasattr(kaleido, "start_sync_server"):
+        try:
+            kaleido.start_sync_server(silence_warnings=True)
+        except Exception:
+            pass
+    try:
+        pio.to_image({"data": [], "layout": {}}, format="png", width=10, height=10)
+    except Exception as e:
+        print(f"Lỗi khi khởi động tiến trình render: {e}")
+
+
+def _render_figure_in_worker(figure_json, image_format, width, height, scale):
+    """Render figure (dạng JSON) trong tiến trình của pool, bỏ qua bước validate của plotly"""
+    return pio.to_image(json.loads(figure_json), format=image_format, width=width, height=height, scale=scale, validate=False)
+
+
+def run_render_server(host=RENDER_SERVER_HOST, port=RENDER_SERVER_PORT, workers=RENDER_SERVER_WORKERS):
+    """
+    Chạy render server (chặn đến khi nhận /shutdown):
+    - POST /render: body JSON {figure, format, width, height, scale}, trả về nội dung ảnh
+    - GET /health: trạng thái server (số tiến trình, số ảnh đã render, thời gian chạy)
+    - POST /shutdown: dừng server và pool tiến trình
+    """
+    render_pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up_render_worker)
+    # Gửi một lượt render nhỏ tới từng tiến trình để tất cả đều được khởi động trước khi notebook gọi tới
+    warm_up_futures = [render_pool.submit(_render_figure_in_worker, '{"data": [], "layout": {}}', "png", 10, 10, 1) for _ in range(workers)]
+    server_state = {"rendered": 0, "failed": 0, "started_at": time.time(), "lock": threading.Lock()}
+
+    class _RenderRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status_code, body, content_type):
+            self.send_response(status_code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status_code, data):
+            self._send(status_code, json.dumps(data).encode("utf-8"), "application/json")
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": "not found"})
+                return
+            with server_state["lock"]:
+                health = {
+                    "status": "ok",
+                    "workers": workers,
+                    "ready": all(future.done() for future in warm_up_futures),
+                    "rendered": server_state["rendered"],
+                    "failed": server_state["failed"],
+                    "uptime_seconds": round(time.time() - server_state["started_at"], 1),
+                }
+            self._send_json(200, health)
+
+        def do_POST(self):
+            if self.path == "/shutdown":
+                self._send_json(200, {"status": "stopping"})
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                return
+            if self.path != "/render":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            try:
+                request_data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                image_bytes = render_pool.submit(
+                    _render_figure_in_worker,
+                    request_data["figure"],
+                    request_data.get("format", "png"),
+                    request_data.get("width"),
+                    request_data.get("height"),
+                    request_data.get("scale", 1),
+                ).result(timeout=RENDER_TIMEOUT_SECONDS)
+            except Exception as e:
+                with server_state["lock"]:
+                    server_state["failed"] += 1
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+
+            with server_state["lock"]:
+                server_state["rendered"] += 1
+            self._send(200, image_bytes, "application/octet-stream")
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), _RenderRequestHandler)
+    except OSError as e:
+        # Cổng đã được dùng, thường là do một render server khác đang chạy
+        print(f"Không thể khởi động render server tại {host}:{port}: {e}")
+        render_pool.shutdown(wait=False, cancel_futures=True)
+        return
+    server.daemon_threads = True
+
+    print(f"Render server đang chạy tại http://{host}:{port} với {workers} tiến trình.")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        render_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ==============================================================================
+# PHÍA NOTEBOOK: GỬI FIGURE TỚI SERVER, TỰ RENDER NẾU SERVER KHÔNG CHẠY
+# ==============================================================================
+def _get_render_session():
+    session = getattr(_render_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _render_thread_local.session = session
+    return session
+
+
+def check_render_server(timeout=1):
+    """Health check render server, trả về dict trạng thái hoặc None nếu server không phản hồi"""
+    try:
+        response = _get_render_session().get(f"{RENDER_SERVER_URL}/health", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException:
+        return None
+
+
+def _is_render_server_available():
+    """Kết quả health check được nhớ lại, server không phản hồi thì chỉ kiểm tra lại sau RENDER_SERVER_RECHECK_SECONDS"""
+    now = time.monotonic()
+    if _render_server_state["available"] is None or (
+        not _render_server_state["available"] and now - _render_server_state["checked_at"] > RENDER_SERVER_RECHECK_SECONDS
+    ):
+        _render_server_state["available"] = check_render_server() is not None
+        _render_server_state["checked_at"] = now
+    return _render_server_state["available"]
+
+
+def stop_render_server(timeout=5):
+    """Yêu cầu render server dừng lại"""
+    try:
+        _get_render_session().post(f"{RENDER_SERVER_URL}/shutdown", timeout=timeout)
+    except requests.exceptions.RequestException:
+        pass
+
+
+def render_figure(fig, image_format="png", width=None, height=None, scale=1):
+    """
+    Render figure thành ảnh qua render server (Kaleido đã khởi động sẵn),
+    tự render bằng fig.to_image nếu server không chạy hoặc render lỗi
+    """
+    if _is_render_server_available():
+        try:
+            response = _get_render_session().post(
+                f"{RENDER_SERVER_URL}/render",
+                data=json.dumps({"figure": fig.to_json(), "format": image_format, "width": width, "height": height, "scale": scale}),
+                headers={"Content-Type": "application/json"},
+                timeout=RENDER_TIMEOUT_SECONDS,
+            )
+            if response.status_code == 200:
+                return response.content
+            print(f"Render server trả về lỗi, tự render: {response.text[:200]}")
+        except requests.exceptions.RequestException as e:
+            print(f"Không kết nối được render server, tự render: {e}")
+            _render_server_state["available"] = False
+            _render_server_state["checked_at"] = time.monotonic()
+
+    return fig.to_image(format=image_format, width=width, height=height, scale=scale)
+
+
+if __name__ == "__main__":
+    run_render_server()
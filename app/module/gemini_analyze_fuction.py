@@ -213,7 +213,11 @@ def analyze_news_sectors(model_dict, news_df):
         return [""] * num_news
 
 
-def get_filtered_news_index(model_dict, news_df, num_articles, max_retry=5):
+def get_filtered_news_index(model_dict, news_df, num_articles, max_retry=5, strict=True):
+    """
+    Phân loại tin vào 3 nhóm trong_nuoc/quoc_te/doanh_nghiep và chọn num_articles tin nổi bật nhất mỗi nhóm.
+    strict=False dùng khi lọc sơ bộ từng lô: chấp nhận nhóm có ít hơn num_articles tin và bỏ các index không có trong news_df
+    """
     news_titles_str = news_df[["title", "content"]].to_csv(index=True, sep="|", header=False, lineterminator="\\n")
 
     prompt = f"""
@@ -267,6 +271,14 @@ def get_filtered_news_index(model_dict, news_df, num_articles, max_retry=5):
         if not required_keys.issubset(data.keys()):
             raise ValueError("Kết quả JSON thiếu các key bắt buộc.")
 
+        if not strict:
+            valid_index = set(news_df.index)
+            # Luôn trả về đủ 3 nhóm, nhóm có giá trị không phải danh sách được coi là rỗng
+            return {
+                key: [idx for idx in data[key] if idx in valid_index][:num_articles] if isinstance(data[key], list) else []
+                for key in ["trong_nuoc", "quoc_te", "doanh_nghiep"]
+            }
+
         if not all(isinstance(data[key], list) and len(data[key]) == num_articles for key in required_keys):
             raise ValueError(f"Mỗi danh sách trong JSON phải là một mảng chứa đúng {num_articles} phần tử.")
         return data
@@ -274,6 +286,65 @@ def get_filtered_news_index(model_dict, news_df, num_articles, max_retry=5):
     raise ValueError(f"Không thể nhận được kết quả hợp lệ từ AI sau {max_retry} lần thử!")
 
 
+def stream_filtered_news(model_dict, article_stream, num_articles, batch_size=150, max_workers=2):
+    """
+    Lọc tin nổi bật trong lúc vẫn đang crawl (dùng với stream_articles):
+    - Gom bài viết thành từng lô batch_size, mỗi lô đủ số lượng được gửi ngay cho AI lọc sơ bộ
+      num_articles tin/nhóm ở luồng nền trong khi các nguồn còn lại vẫn đang tải
+    - Vòng sơ bộ chỉ là bộ lọc heuristic để thu nhỏ prompt: AI chọn theo từng lô nên không đảm bảo
+      tin nổi bật nhất của toàn bộ dữ liệu luôn được giữ lại. get_filtered_news_index lần cuối chạy
+      trên các tin đã qua vòng sơ bộ, hoặc trên toàn bộ tin nếu danh sách sơ bộ rỗng/không đủ số lượng
+
+    Returns:
+        tuple: (raw_news_df, filtered_news_index_dict) với index trong dict là index của raw_news_df
+    """
+    article_list = []
+    batch_start = 0
+    shortlist_futures = []
+    shortlist_index = []
+
+    def _shortlist_batch(batch_df):
+        # Lô nhỏ hơn tổng số tin cần chọn thì giữ nguyên, không cần gọi AI
+        if len(batch_df) <= num_articles * 3:
+            return list(batch_df.index)
+        try:
+            batch_index_dict = get_filtered_news_index(model_dict, batch_df, num_articles, strict=False)
+        except Exception as e:
+            print(f"Lỗi khi lọc sơ bộ lô tin tức, giữ nguyên cả lô: {e}")
+            return list(batch_df.index)
+        return [idx for idx_list in batch_index_dict.values() for idx in idx_list]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for article in article_stream:
+            article_list.append(article)
+            if len(article_list) - batch_start >= batch_size:
+                batch_df = pd.DataFrame(article_list[batch_start:], index=range(batch_start, len(article_list)))
+                shortlist_futures.append(executor.submit(_shortlist_batch, batch_df))
+                batch_start = len(article_list)
+
+        if batch_start == 0:
+            # Toàn bộ tin chưa đủ một lô, lọc trực tiếp một lần như cách cũ
+            shortlist_index = list(range(len(article_list)))
+        elif batch_start < len(article_list):
+            batch_df = pd.DataFrame(article_list[batch_start:], index=range(batch_start, len(article_list)))
+            shortlist_futures.append(executor.submit(_shortlist_batch, batch_df))
+
+        for future in shortlist_futures:
+            shortlist_index.extend(future.result())
+
+    raw_news_df = pd.DataFrame(article_list)
+    shortlist_index = sorted(set(shortlist_index))
+    if len(shortlist_index) < min(num_articles * 3, len(raw_news_df)):
+        # Các lô lọc sơ bộ lỗi hoặc AI trả về quá ít tin: lọc lần cuối trên toàn bộ tin
+        print("Danh sách tin sơ bộ không đủ, lọc lần cuối trên toàn bộ tin tức.")
+        shortlist_df = raw_news_df
+    else:
+        shortlist_df = raw_news_df.loc[shortlist_index]
+    filtered_news_index_dict = get_filtered_news_index(model_dict, shortlist_df, num_articles)
+
+    return raw_news_df, filtered_news_index_dict
+
+
 def get_weekly_top_news(model_dict, news_df, news_type, num_articles, max_retry=10):
     """
     Chọn ra đúng num_articles tin nổi bật nhất toàn bộ (không phân nhóm), trả về list index.
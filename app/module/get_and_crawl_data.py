@@ -4,8 +4,224 @@ import os
 sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "import"))
 
 from import_default import *
-from import_database import *
+# Chỉ cần load_env, không import import_database để crawler (và benchmark offline) không mở kết nối Mongo/MSSQL
+from import_env import *
 from import_other import *
+from import_http import *
+
+# lxml là thư viện tùy chọn, nhanh hơn nhiều so với html.parser thuần Python
+try:
+    import lxml
+
+    CRAWL_HTML_PARSER = "lxml"
+except ImportError:
+    CRAWL_HTML_PARSER = "html.parser"
+
+import soupsieve as sv
+
+
+# ==============================================================================
+# BỘ PARSE HTML VÀ CÁC SELECTOR BIÊN DỊCH SẴN CHO TỪNG TRANG
+# ==============================================================================
+_CAFEF_CONTENT_SELECTORS = [sv.compile(css) for css in ["div.contentdetail", "div#contentdetail", "div.detail-content", "article"]]
+_VIETNAMBIZ_CONTENT_SELECTORS = [sv.compile(css) for css in ["div.vnbcbc-body", "div.article-body-content", "div.post-body-content"]]
+_TIME_CLASS_PATTERN = re.compile("time|date|publish", re.IGNORECASE)
+
+
+def _make_soup(html):
+    """Parse HTML bằng backend CRAWL_HTML_PARSER (mặc định lxml nếu đã cài)"""
+    return BeautifulSoup(html, CRAWL_HTML_PARSER)
+
+
+def _select_first(soup, selector_list):
+    """Trả về phần tử khớp với selector đầu tiên trong danh sách (theo thứ tự ưu tiên)"""
+    for selector in selector_list:
+        element = selector.select_one(soup)
+        if element:
+            return element
+    return None
+
+
+def _find_div_with_most_paragraphs(soup):
+    """Fallback: trong 20 div đầu tiên, lấy div có nhiều thẻ p nhất (tối thiểu 3)"""
+    divs = soup.find_all("div", limit=20)
+    if not divs:
+        return None
+    best_div, best_count = max(((div, len(div.find_all("p"))) for div in divs), key=lambda x: x[1])
+    return best_div if best_count >= 3 else None
+
+
+# ==============================================================================
+# CẤU HÌNH CRAWLER
+# ==============================================================================
+CRAWL_MAX_WORKERS = 16  # Số luồng tải bài viết đồng thời
+CRAWL_DEADLINE_SECONDS = 600  # Thời gian tối đa cho một lần crawl_articles, hết hạn các request còn lại bị bỏ qua
+CRAWL_STREAM_QUEUE_SIZE = 64  # Số bài viết tối đa chờ trong hàng đợi của stream_articles trước khi dừng tải thêm
+NEAR_DUPLICATE_THRESHOLD = 0.5  # Độ tương đồng Jaccard (ước lượng bằng MinHash) để coi hai bài là trùng nội dung
+
+
+def _http_get(url, headers=None, timeout=10, conditional=False):
+    """
+    GET qua http_get dùng chung (giới hạn tốc độ, thử lại, circuit breaker theo host)
+    Args:
+        conditional: gửi If-None-Match/If-Modified-Since theo lần tải trước (dùng cho trang danh mục, RSS),
+                     nếu server trả 304 thì dùng lại nội dung đã lưu trong cache
+    """
+    headers = dict(headers or {})
+    cached_page = _get_cached_http_page(url) if conditional else None
+    if cached_page:
+        if cached_page["etag"]:
+            headers["If-None-Match"] = cached_page["etag"]
+        if cached_page["last_modified"]:
+            headers["If-Modified-Since"] = cached_page["last_modified"]
+
+    response = http_get(url, headers=headers, timeout=timeout)
+
+    if conditional:
+        if response.status_code == 304 and cached_page:
+            # 304 không kèm Content-Type, khôi phục encoding của lần tải trước để response.text giải mã đúng
+            response.status_code = 200
+            response._content = cached_page["body"]
+            response.encoding = cached_page["encoding"]
+            if cached_page["content_type"]:
+                response.headers["Content-Type"] = cached_page["content_type"]
+        elif response.status_code == 200 and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            _save_cached_http_page(url, response)
+    return response
+
+
+# ==============================================================================
+# CACHE BÀI VIẾT CỤC BỘ (SQLITE) THEO URL ĐÃ CHUẨN HÓA
+# ==============================================================================
+ARTICLE_CACHE_PATH = os.path.join(os.path.dirname(os.getcwd()), "cache", "articles.sqlite")
+ARTICLE_CACHE_MAX_AGE_DAYS = 14  # Bài viết cũ hơn sẽ bị xóa khỏi cache
+
+
+def _normalize_article_url(url):
+    """Chuẩn hóa URL để làm khóa cache: bỏ fragment, tham số utm_*, dấu / cuối và viết thường host"""
+    parsed = urlparse(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parsed.query) if not k.lower().startswith("utm_")])
+    path = parsed.path.rstrip("/") or "/"
+    return parsed._replace(scheme=parsed.scheme.lower() or "https", netloc=parsed.netloc.lower(), path=path, query=query, fragment="").geturl()
+
+
+_article_cache_state = {"conn": None, "path": None}
+_article_cache_lock = threading.RLock()
+
+
+def _get_article_cache_connection():
+    """
+    Một kết nối SQLite dùng chung cho cả tiến trình (gọi trong _article_cache_lock),
+    tạo bảng và dọn dữ liệu cũ một lần khi mở; mở lại nếu ARTICLE_CACHE_PATH thay đổi
+    """
+    if _article_cache_state["conn"] is None or _article_cache_state["path"] != ARTICLE_CACHE_PATH:
+        close_article_cache()
+        os.makedirs(os.path.dirname(ARTICLE_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(ARTICLE_CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles (url TEXT PRIMARY KEY, source TEXT, title TEXT, content TEXT, "
+            "image_url TEXT, published_time TEXT, fetched_at REAL)"
+        )
+        http_page_columns = {row[1] for row in conn.execute("PRAGMA table_info(http_pages)")}
+        if http_page_columns and "encoding" not in http_page_columns:
+            # Bảng từ phiên bản cũ chưa lưu encoding, xóa để tạo lại (chỉ là cache nên không mất dữ liệu)
+            conn.execute("DROP TABLE http_pages")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, "
+            "encoding TEXT, content_type TEXT, fetched_at REAL)"
+        )
+        expired_at = time.time() - ARTICLE_CACHE_MAX_AGE_DAYS * 24 * 60 * 60
+        conn.execute("DELETE FROM articles WHERE fetched_at < ?", (expired_at,))
+        conn.execute("DELETE FROM http_pages WHERE fetched_at < ?", (expired_at,))
+        conn.commit()
+        _article_cache_state["conn"] = conn
+        _article_cache_state["path"] = ARTICLE_CACHE_PATH
+    return _article_cache_state["conn"]
+
+
+def close_article_cache():
+    """Đóng kết nối cache bài viết (lần dùng sau sẽ tự mở lại)"""
+    with _article_cache_lock:
+        if _article_cache_state["conn"] is not None:
+            _article_cache_state["conn"].close()
+            _article_cache_state["conn"] = None
+            _article_cache_state["path"] = None
+
+
+def get_cached_article(url):
+    """Lấy bài viết đã crawl từ cache, trả về dict hoặc None nếu chưa có"""
+    try:
+        with _article_cache_lock:
+            row = _get_article_cache_connection().execute(
+                "SELECT source, title, content, image_url, published_time FROM articles WHERE url = ?", (_normalize_article_url(url),)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi đọc cache bài viết: {e}")
+        return None
+    if row is None:
+        return None
+    source, title, content, image_url, published_time = row
+    return {"source": source, "title": title, "content": content, "image_url": image_url, "article_url": url, "published_time": published_time}
+
+
+def save_cached_article(article):
+    """Lưu một bài viết (dict theo format raw_news_list) vào cache"""
+    try:
+        with _article_cache_lock:
+            conn = _get_article_cache_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _normalize_article_url(article["article_url"]),
+                    article["source"],
+                    article["title"],
+                    article["content"],
+                    article["image_url"],
+                    str(article["published_time"] or ""),
+                    time.time(),
+                ),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi ghi cache bài viết: {e}")
+
+
+def _get_cached_http_page(url):
+    """Lấy ETag, Last-Modified, nội dung và encoding đã lưu của một trang danh mục/RSS"""
+    try:
+        with _article_cache_lock:
+            row = _get_article_cache_connection().execute(
+                "SELECT etag, last_modified, body, encoding, content_type FROM http_pages WHERE url = ?", (_normalize_article_url(url),)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    return {"etag": row[0], "last_modified": row[1], "body": row[2], "encoding": row[3], "content_type": row[4]}
+
+
+def _save_cached_http_page(url, response):
+    """Lưu nội dung trang danh mục/RSS kèm ETag, Last-Modified, encoding để lần sau gửi conditional GET"""
+    try:
+        with _article_cache_lock:
+            conn = _get_article_cache_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO http_pages (url, etag, last_modified, body, encoding, content_type, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _normalize_article_url(url),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    response.content,
+                    response.encoding,
+                    response.headers.get("Content-Type"),
+                    time.time(),
+                ),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi ghi cache trang: {e}")
 
 
 def get_article_vietstock(url):
@@ -16,11 +232,11 @@ def get_article_vietstock(url):
 
     try:
         # Get webpage content
-        response = requests.get(url, headers=headers)
+        response = _http_get(url, headers=headers)
         response.raise_for_status()
 
         # Parse HTML
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = _make_soup(response.content)
 
         # Find article content
         content_div = soup.find("div", {"itemprop": "articleBody", "id": "vst_detail"})
@@ -93,15 +309,16 @@ def get_cafef_articles_list(url, max_articles):
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _http_get(url, headers=headers, timeout=10, conditional=True)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = _make_soup(response.content)
         entries = []
 
         # Tìm link bài viết hiệu quả
         links = soup.find_all("a", href=True, limit=50)
         article_links = []
+        seen_urls = set()
 
         for link in links:
             href = link.get("href")
@@ -111,7 +328,8 @@ def get_cafef_articles_list(url, max_articles):
                     if href.startswith("/"):
                         href = "https://cafef.vn" + href
 
-                    if href not in [a["url"] for a in article_links]:
+                    if href not in seen_urls:
+                        seen_urls.add(href)
                         article_links.append({"url": href, "title": text})
 
                         if len(article_links) >= max_articles * 2:
@@ -133,6 +351,99 @@ def get_cafef_articles_list(url, max_articles):
         return []
 
 
+def _parse_article_title(soup):
+    """Lấy tiêu đề bài viết từ og:title hoặc thẻ h1"""
+    meta_title = soup.find("meta", {"property": "og:title"})
+    if meta_title and meta_title.get("content"):
+        return meta_title.get("content").strip()
+    h1 = soup.find("h1")
+    return h1.get_text(strip=True) if h1 else ""
+
+
+def _parse_cafef_article(soup):
+    """Tách nội dung và ảnh chính từ HTML bài viết CafeF đã parse, trả về (content, image_url)"""
+    # LOGIC LẤY ẢNH CẢI THIỆN
+    main_image_url = ""
+
+    # Strategy 1: Tìm img có data-role="cover" (ảnh chính của bài viết)
+    cover_img = soup.find("img", {"data-role": "cover"})
+    if cover_img and cover_img.get("src"):
+        cover_src = cover_img.get("src")
+        if any(domain in cover_src for domain in ["cafef.vn", "cafefcdn.com"]):
+            main_image_url = cover_src
+
+    # Strategy 2: Tìm trong meta tags
+    if not main_image_url:
+        meta_selectors = [{"property": "og:image"}, {"name": "twitter:image"}, {"property": "article:image"}]
+
+        for selector in meta_selectors:
+            meta_img = soup.find("meta", selector)
+            if meta_img and meta_img.get("content"):
+                og_image_url = meta_img.get("content")
+                # Kiểm tra xem có phải ảnh từ domain chính không
+                if any(domain in og_image_url for domain in ["cafef.vn", "cafefcdn.com"]):
+                    main_image_url = og_image_url
+                    break
+
+    # Strategy 3: Tìm ảnh đầu tiên trong trang
+    if not main_image_url:
+        all_imgs = soup.find_all("img", limit=15)
+        for img in all_imgs:
+            src = img.get("src")
+            if src and any(domain in src for domain in ["cafef.vn", "cafefcdn.com"]):
+                # Bỏ qua ảnh logo, icon, avatar nhỏ, thumbnail nhỏ
+                if not any(skip in src.lower() for skip in ["logo", "icon", "avatar", "thumb_w/50", "thumb_w/100", "zoom/223_140"]):
+                    # Ưu tiên ảnh có kích thước lớn hơn
+                    if any(size in src for size in ["thumb_w/640", "zoom/600_", "original", "large"]):
+                        main_image_url = src
+                        break
+                    elif not main_image_url:  # Fallback nếu chưa có ảnh nào
+                        main_image_url = src
+
+    # Tìm nội dung bài viết (dùng cho cả Strategy 4 và phần lấy nội dung)
+    content_div = _select_first(soup, _CAFEF_CONTENT_SELECTORS)
+
+    # Strategy 4: Tìm nội dung bài viết và ảnh trong đó
+    if not main_image_url:
+        if content_div:
+            img_in_content = content_div.find("img")
+            if img_in_content and img_in_content.get("src"):
+                main_image_url = img_in_content.get("src")
+
+    # Chuẩn hóa URL ảnh
+    if main_image_url:
+        if not main_image_url.startswith(("http://", "https://")):
+            if main_image_url.startswith("//"):
+                main_image_url = "https:" + main_image_url
+            elif main_image_url.startswith("/"):
+                main_image_url = "https://cafef.vn" + main_image_url
+
+    # Fallback: Tìm div có nhiều paragraph
+    if not content_div:
+        content_div = _find_div_with_most_paragraphs(soup)
+
+    if not content_div:
+        return "", ""
+
+    # Lấy nội dung
+    paragraphs = content_div.find_all("p")
+    article_content = ""
+
+    for p in paragraphs:
+        if p.get("class") and any(cls in ["author", "source", "time", "pAuthor", "caption"] for cls in p.get("class")):
+            continue
+
+        text = p.get_text(strip=True)
+        if text and len(text) > 10:
+            article_content += f"{text}\n"
+
+    # Fallback nếu không có content từ p
+    if len(article_content.strip()) < 50:
+        article_content = content_div.get_text(strip=True)
+
+    return article_content.strip(), main_image_url
+
+
 def get_article_cafef(url):
     """
     Lấy nội dung chi tiết một bài viết từ CafeF (cấu trúc giống get_article_vietstock)
@@ -148,156 +459,87 @@ def get_article_cafef(url):
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=8)
+        response = _http_get(url, headers=headers, timeout=8)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # LOGIC LẤY ẢNH CẢI THIỆN
-        main_image_url = ""
-
-        # Strategy 1: Tìm img có data-role="cover" (ảnh chính của bài viết)
-        cover_img = soup.find("img", {"data-role": "cover"})
-        if cover_img and cover_img.get("src"):
-            cover_src = cover_img.get("src")
-            if any(domain in cover_src for domain in ["cafef.vn", "cafefcdn.com"]):
-                main_image_url = cover_src
-
-        # Strategy 2: Tìm trong meta tags
-        if not main_image_url:
-            meta_selectors = [{"property": "og:image"}, {"name": "twitter:image"}, {"property": "article:image"}]
-
-            for selector in meta_selectors:
-                meta_img = soup.find("meta", selector)
-                if meta_img and meta_img.get("content"):
-                    og_image_url = meta_img.get("content")
-                    # Kiểm tra xem có phải ảnh từ domain chính không
-                    if any(domain in og_image_url for domain in ["cafef.vn", "cafefcdn.com"]):
-                        main_image_url = og_image_url
-                        break
+        soup = _make_soup(response.content)
+        return _parse_cafef_article(soup)
 
-        # Strategy 3: Tìm ảnh đầu tiên trong trang
-        if not main_image_url:
-            all_imgs = soup.find_all("img", limit=15)
-            for img in all_imgs:
-                src = img.get("src")
-                if src and any(domain in src for domain in ["cafef.vn", "cafefcdn.com"]):
-                    # Bỏ qua ảnh logo, icon, avatar nhỏ, thumbnail nhỏ
-                    if not any(skip in src.lower() for skip in ["logo", "icon", "avatar", "thumb_w/50", "thumb_w/100", "zoom/223_140"]):
-                        # Ưu tiên ảnh có kích thước lớn hơn
-                        if any(size in src for size in ["thumb_w/640", "zoom/600_", "original", "large"]):
-                            main_image_url = src
-                            break
-                        elif not main_image_url:  # Fallback nếu chưa có ảnh nào
-                            main_image_url = src
-
-        # Strategy 4: Tìm nội dung bài viết và ảnh trong đó
-        if not main_image_url:
-            selectors = [{"class": "contentdetail"}, {"id": "contentdetail"}, {"class": "detail-content"}, "article"]
-
-            content_div = None
-            for selector in selectors:
-                if isinstance(selector, dict):
-                    content_div = soup.find("div", selector)
-                else:
-                    content_div = soup.find(selector)
-                if content_div:
-                    break
-
-            if content_div:
-                img_in_content = content_div.find("img")
-                if img_in_content and img_in_content.get("src"):
-                    main_image_url = img_in_content.get("src")
+    except Exception as e:
+        return "", ""
 
-        # Chuẩn hóa URL ảnh
-        if main_image_url:
-            if not main_image_url.startswith(("http://", "https://")):
-                if main_image_url.startswith("//"):
-                    main_image_url = "https:" + main_image_url
-                elif main_image_url.startswith("/"):
-                    main_image_url = "https://cafef.vn" + main_image_url
 
-        # Tìm nội dung bài viết
-        selectors = [{"class": "contentdetail"}, {"id": "contentdetail"}, {"class": "detail-content"}, "article"]
+def _parse_cafef_published_time(soup):
+    """Tách thời gian đăng bài từ HTML bài viết CafeF đã parse"""
+    # Thử các cách lấy thời gian đăng bài
+    time_selectors = [
+        {"property": "article:published_time"},
+        {"name": "pubdate"},
+        {"property": "og:updated_time"},
+        {"name": "last-modified"},
+    ]
 
-        content_div = None
-        for selector in selectors:
-            if isinstance(selector, dict):
-                content_div = soup.find("div", selector)
-            else:
-                content_div = soup.find(selector)
-            if content_div:
-                break
+    for selector in time_selectors:
+        meta_time = soup.find("meta", selector)
+        if meta_time and meta_time.get("content"):
+            return meta_time.get("content")
 
-        # Fallback: Tìm div có nhiều paragraph
-        if not content_div:
-            divs_with_p = [(div, len(div.find_all("p"))) for div in soup.find_all("div", limit=20)]
-            divs_with_p.sort(key=lambda x: x[1], reverse=True)
-            if divs_with_p and divs_with_p[0][1] >= 3:
-                content_div = divs_with_p[0][0]
+    # Nếu không tìm thấy trong meta, tìm trong các thẻ có class time hoặc date
+    time_elements = soup.find_all(["span", "div", "time"], class_=_TIME_CLASS_PATTERN)
+    for elem in time_elements:
+        text = elem.get_text(strip=True)
+        if text and any(char.isdigit() for char in text) and len(text) > 5:
+            return text
 
-        if not content_div:
-            return "", ""
+    return ""
 
-        # Lấy nội dung
-        paragraphs = content_div.find_all("p")
-        article_content = ""
 
-        for p in paragraphs:
-            if p.get("class") and any(cls in ["author", "source", "time", "pAuthor", "caption"] for cls in p.get("class")):
-                continue
-
-            text = p.get_text(strip=True)
-            if text and len(text) > 10:
-                article_content += f"{text}\n"
-
-        # Fallback nếu không có content từ p
-        if len(article_content.strip()) < 50:
-            article_content = content_div.get_text(strip=True)
+def get_cafef_published_time(url):
+    """
+    Lấy thời gian đăng bài từ URL bài viết CafeF
+    """
+    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
 
-        return article_content.strip(), main_image_url
+    try:
+        response = _http_get(url, headers=headers, timeout=5)
+        response.raise_for_status()
+        soup = _make_soup(response.content)
+        return _parse_cafef_published_time(soup)
 
     except Exception as e:
-        return "", ""
+        return ""
 
 
-def get_cafef_published_time(url):
+def get_article_cafef_full(url):
     """
-    Lấy thời gian đăng bài từ URL bài viết CafeF
+    Lấy toàn bộ thông tin bài viết CafeF chỉ với một request và một lần parse
+    (thay cho việc gọi get_article_cafef và get_cafef_published_time riêng lẻ)
+    Args:
+        url: URL của bài viết cần lấy
+    Returns:
+        dict: content, image_url, title, published_time (chuỗi rỗng nếu lỗi)
     """
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Connection": "keep-alive",
+    }
 
     try:
-        response = requests.get(url, headers=headers, timeout=5)
+        response = _http_get(url, headers=headers, timeout=8)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Thử các cách lấy thời gian đăng bài
-        time_selectors = [
-            {"property": "article:published_time"},
-            {"name": "pubdate"},
-            {"property": "og:updated_time"},
-            {"name": "last-modified"},
-        ]
-
-        for selector in time_selectors:
-            meta_time = soup.find("meta", selector)
-            if meta_time and meta_time.get("content"):
-                return meta_time.get("content")
-
-        # Nếu không tìm thấy trong meta, tìm trong các thẻ có class time hoặc date
-        time_elements = soup.find_all(
-            ["span", "div", "time"], class_=lambda x: x and any(keyword in x.lower() for keyword in ["time", "date", "publish"])
-        )
-        for elem in time_elements:
-            text = elem.get_text(strip=True)
-            if text and any(char.isdigit() for char in text) and len(text) > 5:
-                return text
 
-        return ""
+        soup = _make_soup(response.content)
+        content, image_url = _parse_cafef_article(soup)
+        return {
+            "content": content,
+            "image_url": image_url,
+            "title": _parse_article_title(soup),
+            "published_time": _parse_cafef_published_time(soup),
+        }
 
     except Exception as e:
-        return ""
+        return {"content": "", "image_url": "", "title": "", "published_time": ""}
 
 
 def convert_published_time(time_str):
@@ -334,6 +576,56 @@ def convert_published_time(time_str):
         return pd.NaT
 
 
+def _convert_other_published_time(time_str):
+    """Parse tự động các format thời gian còn lại, bỏ múi giờ (giữ giờ địa phương) như format RFC-822"""
+    parsed_time = pd.to_datetime(time_str, errors="coerce")
+    if parsed_time is not pd.NaT and parsed_time.tzinfo is not None:
+        parsed_time = parsed_time.tz_localize(None)
+    return parsed_time
+
+
+def convert_published_time_series(time_series):
+    """
+    Phiên bản vector hóa của convert_published_time cho cả cột published_time:
+    chia các giá trị theo format bằng mask chuỗi rồi parse mỗi nhóm bằng một lần pd.to_datetime,
+    các giá trị không chuyển đổi được trả về NaT và chỉ in một thông báo tổng hợp
+    """
+    time_text = time_series.where(time_series.notna(), "").astype(str).str.strip()
+    result = pd.Series(pd.NaT, index=time_series.index, dtype="datetime64[ns]")
+    is_empty = time_text == ""
+
+    # Format: "Sat, 12 Jul 2025 17:44:43 +0700"
+    is_offset = ~is_empty & time_text.str.contains(",", regex=False) & time_text.str.contains("+", regex=False)
+    # Format: "Fri, 25 Jul 2025 06:56:10 GMT"
+    is_gmt = ~is_empty & ~is_offset & time_text.str.endswith("GMT")
+    # Format: "2025-07-12T07:13:17"
+    is_iso = ~is_empty & ~is_offset & ~is_gmt & time_text.str.contains("T", regex=False)
+    # Format: "14:31 | 16/07/2025"
+    is_pipe = ~is_empty & ~is_offset & ~is_gmt & ~is_iso & time_text.str.contains("|", regex=False)
+    is_other = ~is_empty & ~is_offset & ~is_gmt & ~is_iso & ~is_pipe
+
+    if is_offset.any():
+        offset_text = time_text[is_offset].str.split("+", n=1).str[0].str.strip()
+        result[is_offset] = pd.to_datetime(offset_text, format="%a, %d %b %Y %H:%M:%S", errors="coerce")
+    if is_gmt.any():
+        gmt_text = time_text[is_gmt].str.replace("GMT", "", regex=False).str.strip()
+        result[is_gmt] = pd.to_datetime(gmt_text, format="%a, %d %b %Y %H:%M:%S", errors="coerce")
+    if is_iso.any():
+        result[is_iso] = pd.to_datetime(time_text[is_iso], format="%Y-%m-%dT%H:%M:%S", errors="coerce")
+    if is_pipe.any():
+        pipe_parts = time_text[is_pipe].str.extract(r"^([^|]*)\|([^|]*)$")
+        pipe_text = pipe_parts[1].str.strip() + " " + pipe_parts[0].str.strip()
+        result[is_pipe] = pd.to_datetime(pipe_text, format="%d/%m/%Y %H:%M", errors="coerce")
+    if is_other.any():
+        result[is_other] = pd.to_datetime([_convert_other_published_time(time_str) for time_str in time_text[is_other]])
+
+    is_failed = ~is_empty & result.isna()
+    if is_failed.any():
+        print(f"Không thể chuyển đổi {is_failed.sum()} giá trị thời gian, ví dụ: {time_text[is_failed].head(5).tolist()}")
+
+    return result
+
+
 def get_data_from_av(from_symbol, to_symbol, column_name):
     """Hàm lấy dữ liệu tỷ giá từ Alpha Vantage"""
     try:
@@ -362,12 +654,13 @@ def get_vietnambiz_articles_list(url, max_articles):
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _http_get(url, headers=headers, timeout=10, conditional=True)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = _make_soup(response.content)
         entries = []
         article_links = []
+        seen_urls = set()
 
         # Tìm các bài viết trong list-news
         list_news = soup.find("div", class_="list-news")
@@ -389,7 +682,8 @@ def get_vietnambiz_articles_list(url, max_articles):
                             href = "https://vietnambiz.vn" + href
 
                         # Kiểm tra URL không trùng lặp
-                        if href not in [a["url"] for a in article_links]:
+                        if href not in seen_urls:
+                            seen_urls.add(href)
                             article_links.append({"url": href, "title": title})
 
                             # Dừng khi đã đủ số lượng cần thiết
@@ -415,7 +709,8 @@ def get_vietnambiz_articles_list(url, max_articles):
                         if href.startswith("/"):
                             href = "https://vietnambiz.vn" + href
 
-                        if href not in [a["url"] for a in article_links]:
+                        if href not in seen_urls:
+                            seen_urls.add(href)
                             article_links.append({"url": href, "title": title})
 
         # Chuyển đổi thành format giống RSS feed
@@ -434,156 +729,197 @@ def get_vietnambiz_articles_list(url, max_articles):
         return []
 
 
-def get_article_vietnambiz(url):
-    """
-    Lấy nội dung chi tiết một bài viết từ VietnamBiz (cấu trúc giống get_article_cafef)
-    Args:
-        url: URL của bài viết cần lấy
-    Returns:
-        tuple: (content, image_url) - giống như get_article_cafef
-    """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Connection": "keep-alive",
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=8)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # LOGIC LẤY ẢNH CẢI THIỆN
-        main_image_url = ""
-
-        # Strategy 1: Tìm ảnh trong div có class="VnBizPreviewMode" (ảnh chính trong nội dung)
-        preview_img = soup.find("div", class_="VnBizPreviewMode")
-        if preview_img:
-            img_tag = preview_img.find("img")
-            if img_tag and img_tag.get("src"):
-                img_src = img_tag.get("src")
-                if any(domain in img_src for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
-                    main_image_url = img_src
-
-        # Strategy 2: Tìm trong meta tags
-        if not main_image_url:
-            meta_selectors = [{"property": "og:image"}, {"name": "twitter:image"}, {"property": "article:image"}]
-
-            for selector in meta_selectors:
-                meta_img = soup.find("meta", selector)
-                if meta_img and meta_img.get("content"):
-                    og_image_url = meta_img.get("content")
-                    # Kiểm tra xem có phải ảnh từ domain chính không
-                    if any(domain in og_image_url for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
-                        main_image_url = og_image_url
-                        break
-
-        # Strategy 3: Tìm ảnh đầu tiên trong vnbcbc-body (nội dung bài viết)
-        if not main_image_url:
-            content_body = soup.find("div", class_="vnbcbc-body")
-            if content_body:
-                all_imgs = content_body.find_all("img", limit=10)
-                for img in all_imgs:
-                    src = img.get("src")
-                    if src and any(domain in src for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
-                        # Bỏ qua ảnh logo, icon, avatar nhỏ
-                        if not any(skip in src.lower() for skip in ["logo", "icon", "avatar", "thumb", "small"]):
-                            # Ưu tiên ảnh có kích thước lớn hơn
-                            if any(size in src for size in ["width=700", "width=600", "original", "large"]) or "?" not in src:
-                                main_image_url = src
-                                break
-                            elif not main_image_url:  # Fallback nếu chưa có ảnh nào
-                                main_image_url = src
+def _parse_vietnambiz_article(soup):
+    """Tách nội dung và ảnh chính từ HTML bài viết VietnamBiz đã parse, trả về (content, image_url)"""
+    # LOGIC LẤY ẢNH CẢI THIỆN
+    main_image_url = ""
+
+    # Strategy 1: Tìm ảnh trong div có class="VnBizPreviewMode" (ảnh chính trong nội dung)
+    preview_img = soup.find("div", class_="VnBizPreviewMode")
+    if preview_img:
+        img_tag = preview_img.find("img")
+        if img_tag and img_tag.get("src"):
+            img_src = img_tag.get("src")
+            if any(domain in img_src for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
+                main_image_url = img_src
+
+    # Strategy 2: Tìm trong meta tags
+    if not main_image_url:
+        meta_selectors = [{"property": "og:image"}, {"name": "twitter:image"}, {"property": "article:image"}]
+
+        for selector in meta_selectors:
+            meta_img = soup.find("meta", selector)
+            if meta_img and meta_img.get("content"):
+                og_image_url = meta_img.get("content")
+                # Kiểm tra xem có phải ảnh từ domain chính không
+                if any(domain in og_image_url for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
+                    main_image_url = og_image_url
+                    break
 
-        # Strategy 4: Tìm ảnh đầu tiên trong trang
-        if not main_image_url:
-            all_imgs = soup.find_all("img", limit=15)
+    # Strategy 3: Tìm ảnh đầu tiên trong vnbcbc-body (nội dung bài viết)
+    if not main_image_url:
+        content_body = soup.find("div", class_="vnbcbc-body")
+        if content_body:
+            all_imgs = content_body.find_all("img", limit=10)
             for img in all_imgs:
                 src = img.get("src")
                 if src and any(domain in src for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
-                    # Bỏ qua ảnh logo, icon, avatar nhỏ, thumbnail nhỏ
-                    if not any(skip in src.lower() for skip in ["logo", "icon", "avatar", "93x60", "215x144"]):
+                    # Bỏ qua ảnh logo, icon, avatar nhỏ
+                    if not any(skip in src.lower() for skip in ["logo", "icon", "avatar", "thumb", "small"]):
                         # Ưu tiên ảnh có kích thước lớn hơn
-                        if any(size in src for size in ["width=700", "width=600", "original", "large"]):
+                        if any(size in src for size in ["width=700", "width=600", "original", "large"]) or "?" not in src:
                             main_image_url = src
                             break
                         elif not main_image_url:  # Fallback nếu chưa có ảnh nào
                             main_image_url = src
 
-        # Chuẩn hóa URL ảnh
-        if main_image_url:
-            if not main_image_url.startswith(("http://", "https://")):
-                if main_image_url.startswith("//"):
-                    main_image_url = "https:" + main_image_url
-                elif main_image_url.startswith("/"):
-                    main_image_url = "https://vietnambiz.vn" + main_image_url
+    # Strategy 4: Tìm ảnh đầu tiên trong trang
+    if not main_image_url:
+        all_imgs = soup.find_all("img", limit=15)
+        for img in all_imgs:
+            src = img.get("src")
+            if src and any(domain in src for domain in ["vietnambiz.vn", "cdn.vietnambiz.vn"]):
+                # Bỏ qua ảnh logo, icon, avatar nhỏ, thumbnail nhỏ
+                if not any(skip in src.lower() for skip in ["logo", "icon", "avatar", "93x60", "215x144"]):
+                    # Ưu tiên ảnh có kích thước lớn hơn
+                    if any(size in src for size in ["width=700", "width=600", "original", "large"]):
+                        main_image_url = src
+                        break
+                    elif not main_image_url:  # Fallback nếu chưa có ảnh nào
+                        main_image_url = src
 
-        # Tìm nội dung bài viết
-        # Strategy 1: Tìm trong vnbcbc-body (nội dung chính)
-        content_div = soup.find("div", class_="vnbcbc-body")
+    # Chuẩn hóa URL ảnh
+    if main_image_url:
+        if not main_image_url.startswith(("http://", "https://")):
+            if main_image_url.startswith("//"):
+                main_image_url = "https:" + main_image_url
+            elif main_image_url.startswith("/"):
+                main_image_url = "https://vietnambiz.vn" + main_image_url
 
-        # Strategy 2: Fallback - tìm trong article-body-content
-        if not content_div:
-            content_div = soup.find("div", class_="article-body-content")
+    # Tìm nội dung bài viết: lần lượt vnbcbc-body (nội dung chính), article-body-content, post-body-content
+    content_div = _select_first(soup, _VIETNAMBIZ_CONTENT_SELECTORS)
 
-        # Strategy 3: Fallback - tìm trong post-body-content
-        if not content_div:
-            content_div = soup.find("div", class_="post-body-content")
+    # Fallback: Tìm div có nhiều paragraph
+    if not content_div:
+        content_div = _find_div_with_most_paragraphs(soup)
 
-        # Fallback: Tìm div có nhiều paragraph
-        if not content_div:
-            divs_with_p = [(div, len(div.find_all("p"))) for div in soup.find_all("div", limit=20)]
-            divs_with_p.sort(key=lambda x: x[1], reverse=True)
-            if divs_with_p and divs_with_p[0][1] >= 3:
-                content_div = divs_with_p[0][0]
+    if not content_div:
+        return "", ""
 
-        if not content_div:
-            return "", ""
+    # Lấy nội dung từ thẻ p và h2, h3
+    article_content = ""
 
-        # Lấy nội dung từ thẻ p và h2, h3
-        article_content = ""
+    # Lấy sapo (mô tả ngắn) nếu có
+    sapo_div = soup.find("div", class_="vnbcbc-sapo")
+    if sapo_div:
+        sapo_text = sapo_div.get_text(strip=True)
+        if sapo_text and len(sapo_text) > 10:
+            article_content += f"{sapo_text}\n\n"
 
-        # Lấy sapo (mô tả ngắn) nếu có
-        sapo_div = soup.find("div", class_="vnbcbc-sapo")
-        if sapo_div:
-            sapo_text = sapo_div.get_text(strip=True)
-            if sapo_text and len(sapo_text) > 10:
-                article_content += f"{sapo_text}\n\n"
-
-        # Lấy nội dung từ các thẻ h2, h3, p
-        content_elements = content_div.find_all(["h2", "h3", "p"])
-
-        for element in content_elements:
-            # Bỏ qua các thẻ có class không mong muốn
-            if element.get("class"):
-                element_classes = element.get("class")
-                if any(cls in ["author", "source", "time", "caption", "PhotoCMS_Caption"] for cls in element_classes):
-                    continue
+    # Lấy nội dung từ các thẻ h2, h3, p
+    content_elements = content_div.find_all(["h2", "h3", "p"])
 
-            # Bỏ qua nội dung trong figcaption
-            if element.find_parent("figcaption"):
+    for element in content_elements:
+        # Bỏ qua các thẻ có class không mong muốn
+        if element.get("class"):
+            element_classes = element.get("class")
+            if any(cls in ["author", "source", "time", "caption", "PhotoCMS_Caption"] for cls in element_classes):
                 continue
 
-            text = element.get_text(strip=True)
-            if text and len(text) > 10:
-                # Thêm heading với định dạng đặc biệt
-                if element.name in ["h2", "h3"]:
-                    article_content += f"\n{text}\n"
-                else:
-                    article_content += f"{text}\n"
+        # Bỏ qua nội dung trong figcaption
+        if element.find_parent("figcaption"):
+            continue
+
+        text = element.get_text(strip=True)
+        if text and len(text) > 10:
+            # Thêm heading với định dạng đặc biệt
+            if element.name in ["h2", "h3"]:
+                article_content += f"\n{text}\n"
+            else:
+                article_content += f"{text}\n"
 
-        # Fallback nếu không có content từ các thẻ trên
-        if len(article_content.strip()) < 50:
-            article_content = content_div.get_text(strip=True)
+    # Fallback nếu không có content từ các thẻ trên
+    if len(article_content.strip()) < 50:
+        article_content = content_div.get_text(strip=True)
+
+    return article_content.strip(), main_image_url
 
-        return article_content.strip(), main_image_url
+
+def get_article_vietnambiz(url):
+    """
+    Lấy nội dung chi tiết một bài viết từ VietnamBiz (cấu trúc giống get_article_cafef)
+    Args:
+        url: URL của bài viết cần lấy
+    Returns:
+        tuple: (content, image_url) - giống như get_article_cafef
+    """
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Connection": "keep-alive",
+    }
+
+    try:
+        response = _http_get(url, headers=headers, timeout=8)
+        response.raise_for_status()
+
+        soup = _make_soup(response.content)
+        return _parse_vietnambiz_article(soup)
 
     except Exception as e:
         print(f"Lỗi khi lấy bài viết từ VietnamBiz: {e}")
         return "", ""
 
 
+def _parse_vietnambiz_published_time(soup):
+    """Tách thời gian đăng bài từ HTML bài viết VietnamBiz đã parse"""
+    # Strategy 1: Tìm trong span có class vnbcbat-data (cấu trúc chính của VietnamBiz)
+    time_span = soup.find("span", class_="vnbcbat-data")
+    if time_span:
+        time_text = time_span.get_text(strip=True)
+        if time_text and any(char.isdigit() for char in time_text):
+            return time_text
+
+    # Strategy 2: Tìm trong data-role="publishdate"
+    publish_date = soup.find(attrs={"data-role": "publishdate"})
+    if publish_date:
+        time_text = publish_date.get_text(strip=True)
+        if time_text and any(char.isdigit() for char in time_text):
+            return time_text
+
+    # Strategy 3: Thử các meta tags thông thường
+    time_selectors = [
+        {"property": "article:published_time"},
+        {"name": "pubdate"},
+        {"property": "og:updated_time"},
+        {"name": "last-modified"},
+        {"property": "article:modified_time"},
+    ]
+
+    for selector in time_selectors:
+        meta_time = soup.find("meta", selector)
+        if meta_time and meta_time.get("content"):
+            return meta_time.get("content")
+
+    # Strategy 4: Tìm trong các thẻ có class liên quan đến time/date
+    time_elements = soup.find_all(["span", "div", "time"], class_=_TIME_CLASS_PATTERN)
+    for elem in time_elements:
+        text = elem.get_text(strip=True)
+        if text and any(char.isdigit() for char in text) and len(text) > 5:
+            # Ưu tiên format có dạng "HH:MM | DD/MM/YYYY"
+            if "|" in text or "/" in text:
+                return text
+
+    # Strategy 5: Tìm trong title attribute
+    title_elements = soup.find_all(attrs={"title": True})
+    for elem in title_elements:
+        title_text = elem.get("title", "")
+        if title_text and any(char.isdigit() for char in title_text) and "/" in title_text:
+            return title_text
+
+    return ""
+
+
 def get_vietnambiz_published_time(url):
     """
     Lấy thời gian đăng bài từ URL bài viết VietnamBiz
@@ -599,81 +935,59 @@ def get_vietnambiz_published_time(url):
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=5)
+        response = _http_get(url, headers=headers, timeout=5)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Strategy 1: Tìm trong span có class vnbcbat-data (cấu trúc chính của VietnamBiz)
-        time_span = soup.find("span", class_="vnbcbat-data")
-        if time_span:
-            time_text = time_span.get_text(strip=True)
-            if time_text and any(char.isdigit() for char in time_text):
-                return time_text
-
-        # Strategy 2: Tìm trong data-role="publishdate"
-        publish_date = soup.find(attrs={"data-role": "publishdate"})
-        if publish_date:
-            time_text = publish_date.get_text(strip=True)
-            if time_text and any(char.isdigit() for char in time_text):
-                return time_text
-
-        # Strategy 3: Thử các meta tags thông thường
-        time_selectors = [
-            {"property": "article:published_time"},
-            {"name": "pubdate"},
-            {"property": "og:updated_time"},
-            {"name": "last-modified"},
-            {"property": "article:modified_time"},
-        ]
-
-        for selector in time_selectors:
-            meta_time = soup.find("meta", selector)
-            if meta_time and meta_time.get("content"):
-                return meta_time.get("content")
-
-        # Strategy 4: Tìm trong các thẻ có class liên quan đến time/date
-        time_elements = soup.find_all(
-            ["span", "div", "time"],
-            class_=lambda x: x and any(keyword in x.lower() for keyword in ["time", "date", "publish", "vnbcba-time"]),
-        )
-        for elem in time_elements:
-            text = elem.get_text(strip=True)
-            if text and any(char.isdigit() for char in text) and len(text) > 5:
-                # Ưu tiên format có dạng "HH:MM | DD/MM/YYYY"
-                if "|" in text or "/" in text:
-                    return text
-
-        # Strategy 5: Tìm trong title attribute
-        title_elements = soup.find_all(attrs={"title": True})
-        for elem in title_elements:
-            title_text = elem.get("title", "")
-            if title_text and any(char.isdigit() for char in title_text) and "/" in title_text:
-                return title_text
-
-        return ""
+        soup = _make_soup(response.content)
+        return _parse_vietnambiz_published_time(soup)
 
     except Exception as e:
         print(f"Lỗi khi lấy thời gian đăng bài từ VietnamBiz: {e}")
         return ""
 
 
+def get_article_vietnambiz_full(url):
+    """
+    Lấy toàn bộ thông tin bài viết VietnamBiz chỉ với một request và một lần parse
+    (thay cho việc gọi get_article_vietnambiz và get_vietnambiz_published_time riêng lẻ)
+    Args:
+        url: URL của bài viết cần lấy
+    Returns:
+        dict: content, image_url, title, published_time (chuỗi rỗng nếu lỗi)
+    """
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Connection": "keep-alive",
+    }
+
+    try:
+        response = _http_get(url, headers=headers, timeout=8)
+        response.raise_for_status()
+
+        soup = _make_soup(response.content)
+        content, image_url = _parse_vietnambiz_article(soup)
+        return {
+            "content": content,
+            "image_url": image_url,
+            "title": _parse_article_title(soup),
+            "published_time": _parse_vietnambiz_published_time(soup),
+        }
+
+    except Exception as e:
+        print(f"Lỗi khi lấy bài viết từ VietnamBiz: {e}")
+        return {"content": "", "image_url": "", "title": "", "published_time": ""}
+
+
 def get_article_vneconomy(rss_url, num_articles):
     articles_list = []
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
-    response = None
-    for attempt in range(3):
-        try:
-            response = requests.get(rss_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            break
-        except requests.exceptions.RequestException as e:
-            if attempt < 2:
-                time.sleep(2)
-            else:
-                return []
-    if response is None:
+    # Việc thử lại với backoff đã được xử lý trong http_get
+    try:
+        response = _http_get(rss_url, headers=headers, timeout=10, conditional=True)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
         return []
 
     try:
@@ -685,7 +999,7 @@ def get_article_vneconomy(rss_url, num_articles):
         # Lặp qua các bài báo trong feed
         for entry in feed.entries[:num_articles]:
             content_html = entry.get("content", [{}])[0].get("value", "") or entry.get("summary", "")
-            soup = BeautifulSoup(content_html, "html.parser")
+            soup = _make_soup(content_html)
             content_text = "\n".join(p.get_text(strip=True) for p in soup.find_all("p"))
 
             # Lấy URL hình ảnh
@@ -735,4 +1049,346 @@ def get_today_date() -> pd.Timestamp:
         return today - pd.DateOffset(days=2)
     # Nếu là ngày trong tuần, trả về chính ngày hôm nay
     else:
-        return today
\ No newline at end of file
+        return today
+
+# ==============================================================================
+# CRAWLER ĐỒNG THỜI CHO CÁC NGUỒN TIN
+# ==============================================================================
+def get_vietstock_articles_list(url, max_articles):
+    """
+    Lấy danh sách bài viết từ RSS VietStock qua session dùng chung
+    Returns:
+        list: Các entry của feedparser (có title, id, published)
+    """
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    }
+    try:
+        response = _http_get(url, headers=headers, timeout=10, conditional=True)
+        response.raise_for_status()
+        return feedparser.parse(response.content).entries[:max_articles]
+    except Exception as e:
+        print(f"Lỗi khi lấy danh sách bài viết từ VietStock: {e}")
+        return []
+
+
+# Cấu hình xử lý cho từng nguồn tin, dùng chung cho các notebook
+# - batch: một lần gọi trả về danh sách bài viết hoàn chỉnh
+# - item_by_item: lấy danh sách bài viết rồi tải chi tiết từng bài, dùng get_full_details nếu nguồn
+#   hỗ trợ lấy nội dung, ảnh và thời gian đăng chỉ với một request, ngược lại dùng get_details + get_published_time
+CRAWL_SOURCE_HANDLERS = {
+    "VnEconomy": {
+        "type": "batch",
+        "process_batch": get_article_vneconomy,
+    },
+    "VietStock": {
+        "type": "item_by_item",
+        "get_articles": get_vietstock_articles_list,
+        "get_details": lambda entry: get_article_vietstock(entry["id"]),
+        "get_published_time": lambda entry: getattr(entry, "published", "") or "",
+    },
+    "CafeF": {
+        "type": "item_by_item",
+        "get_articles": get_cafef_articles_list,
+        "get_full_details": lambda entry: get_article_cafef_full(entry["id"]),
+    },
+    "Vietnambiz": {
+        "type": "item_by_item",
+        "get_articles": get_vietnambiz_articles_list,
+        "get_full_details": lambda entry: get_article_vietnambiz_full(entry["id"]),
+    },
+}
+
+
+def _crawl_article_detail(source, handler, entry):
+    """Tải chi tiết một bài viết và trả về dict theo format của raw_news_list"""
+    if "get_full_details" in handler:
+        details = handler["get_full_details"](entry)
+        content, image_url, published_time = details["content"], details["image_url"], details["published_time"]
+        title = entry["title"] or details["title"]
+    else:
+        content, image_url = handler["get_details"](entry)
+        published_time = handler["get_published_time"](entry)
+        title = entry["title"]
+
+    return {
+        "source": source,
+        "title": title,
+        "content": content,
+        "image_url": image_url,
+        "article_url": entry["id"],
+        "published_time": published_time,
+    }
+
+
+# ==============================================================================
+# LOẠI BÀI VIẾT GẦN TRÙNG LẶP (MINHASH + LSH)
+# ==============================================================================
+_MINHASH_NUM_PERM = 64  # Số hàm băm của chữ ký MinHash
+# Số band LSH, mỗi band gồm _MINHASH_NUM_PERM / _MINHASH_BANDS giá trị (32 x 2).
+# Hai bài có độ tương đồng s thành ứng viên với xác suất 1 - (1 - s^2)^32: ~100% tại ngưỡng 0.5,
+# điểm giữa đường cong (1/32)^(1/2) ≈ 0.18 thấp hơn ngưỡng nên gần như không bỏ sót; ứng viên thừa bị loại khi so cả chữ ký
+_MINHASH_BANDS = 32
+_MINHASH_MAX_WORDS = 400  # Chỉ lấy tiêu đề và 400 từ đầu của nội dung để tạo chữ ký
+_MINHASH_PRIME = np.uint64(4294967311)  # Số nguyên tố lớn hơn 2^32
+_minhash_random_state = np.random.RandomState(1)
+_MINHASH_A = _minhash_random_state.randint(1, 2**31, size=_MINHASH_NUM_PERM).astype(np.uint64)
+_MINHASH_B = _minhash_random_state.randint(0, 2**31, size=_MINHASH_NUM_PERM).astype(np.uint64)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _get_minhash_signature(text):
+    """Chữ ký MinHash từ các cụm 3 từ liên tiếp của văn bản, None nếu văn bản rỗng"""
+    words = _WORD_PATTERN.findall(text.lower())[:_MINHASH_MAX_WORDS]
+    if not words:
+        return None
+    shingles = {" ".join(words[i : i + 3]) for i in range(max(len(words) - 2, 1))}
+    shingle_hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # Mỗi hoán vị (a * x + b) mod p được tính cho toàn bộ shingle cùng lúc, lấy giá trị nhỏ nhất theo từng hoán vị
+    return ((np.outer(shingle_hashes, _MINHASH_A) + _MINHASH_B) % _MINHASH_PRIME).min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    Chỉ mục MinHash + LSH để phát hiện bài viết gần trùng (cùng một tin đăng lại trên nhiều nguồn)
+    Dùng: index.is_duplicate(article) trả về True nếu bài đã có bản gần giống trong chỉ mục, ngược lại thêm bài vào chỉ mục
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.rows_per_band = _MINHASH_NUM_PERM // _MINHASH_BANDS
+        self.band_buckets = [{} for _ in range(_MINHASH_BANDS)]
+        self.signatures = []
+
+    def is_duplicate(self, article):
+        signature = _get_minhash_signature(f"{article.get('title') or ''} {article.get('content') or ''}")
+        if signature is None:
+            return False
+
+        band_keys = [signature[i * self.rows_per_band : (i + 1) * self.rows_per_band].tobytes() for i in range(_MINHASH_BANDS)]
+        candidate_ids = set()
+        for band_bucket, band_key in zip(self.band_buckets, band_keys):
+            candidate_ids.update(band_bucket.get(band_key, ()))
+        for candidate_id in candidate_ids:
+            if np.mean(self.signatures[candidate_id] == signature) >= self.threshold:
+                return True
+
+        signature_id = len(self.signatures)
+        self.signatures.append(signature)
+        for band_bucket, band_key in zip(self.band_buckets, band_keys):
+            band_bucket.setdefault(band_key, []).append(signature_id)
+        return False
+
+
+def remove_near_duplicate_articles(article_list, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Loại các bài gần trùng nội dung, giữ bài xuất hiện đầu tiên và giữ nguyên thứ tự"""
+    near_duplicate_index = NearDuplicateIndex(threshold)
+    unique_article_list = [article for article in article_list if not near_duplicate_index.is_duplicate(article)]
+    if len(unique_article_list) < len(article_list):
+        print(f"Đã loại {len(article_list) - len(unique_article_list)} bài viết gần trùng lặp.")
+    return unique_article_list
+
+
+def discover_articles(article_url_dict, source_handlers=None, max_workers=CRAWL_MAX_WORKERS, deadline=None):
+    """
+    Tải song song tất cả trang danh mục/RSS của các nguồn và loại bài trùng URL giữa các nguồn
+    Args:
+        article_url_dict: {nguồn: {url danh mục/RSS: số bài cần lấy}}
+        source_handlers: cấu hình xử lý cho từng nguồn (mặc định CRAWL_SOURCE_HANDLERS)
+        max_workers: số luồng tải đồng thời
+        deadline: hạn chót (mốc time.monotonic, từ get_crawl_deadline) cho các request, None nếu không giới hạn
+    Returns:
+        list: Hàng đợi công việc [(source, entry, article)] theo thứ tự của article_url_dict,
+              article là dict hoàn chỉnh với nguồn batch, None nếu cần tải chi tiết từ entry
+    """
+    source_handlers = source_handlers or CRAWL_SOURCE_HANDLERS
+    listing_slots = []  # (source, loại handler, future trả về danh sách entry/bài viết)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for source, rss_list in article_url_dict.items():
+            handler = source_handlers.get(source)
+            if not handler:
+                print(f"Warning: No handler found for source '{source}'. Skipping.")
+                continue
+
+            for rss_url, num_articles in rss_list.items():
+                if handler["type"] == "batch":
+                    listing_slots.append((source, "batch", executor.submit(call_with_crawl_deadline, deadline, handler["process_batch"], rss_url, num_articles)))
+                elif handler["type"] == "item_by_item":
+                    listing_slots.append((source, "item_by_item", executor.submit(call_with_crawl_deadline, deadline, handler["get_articles"], rss_url, num_articles)))
+
+        work_queue = []
+        seen_urls = set()
+        for source, handler_type, future in listing_slots:
+            try:
+                items = future.result()
+            except Exception as e:
+                print(f"Lỗi khi lấy danh sách bài viết từ {source}: {e}")
+                continue
+
+            for item in items:
+                if handler_type == "batch":
+                    article_url = item["article_url"]
+                    work_item = (source, None, item)
+                else:
+                    article_url = item["id"]
+                    work_item = (source, item, None)
+                url_key = _normalize_article_url(article_url) if article_url else None
+
+                # Bài không có URL thì không thể so trùng, giữ lại
+                if url_key:
+                    if url_key in seen_urls:
+                        continue
+                    seen_urls.add(url_key)
+                work_queue.append(work_item)
+
+    return work_queue
+
+
+def crawl_articles(article_url_dict, source_handlers=None, max_workers=CRAWL_MAX_WORKERS, use_cache=True, deadline_seconds=CRAWL_DEADLINE_SECONDS, dedup_threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Crawl toàn bộ các nguồn tin trong article_url_dict: tải danh mục song song (discover_articles),
+    sau đó tải chi tiết các bài viết không trùng lặp song song
+    Args:
+        article_url_dict: {nguồn: {url danh mục/RSS: số bài cần lấy}}
+        source_handlers: cấu hình xử lý cho từng nguồn (mặc định CRAWL_SOURCE_HANDLERS)
+        max_workers: số luồng tải đồng thời (mỗi host vẫn bị giới hạn bởi HTTP_MAX_CONCURRENCY_PER_HOST)
+        use_cache: bỏ qua các bài viết đã có trong cache SQLite, chỉ tải bài mới
+        deadline_seconds: thời gian tối đa cho cả lần crawl, các bài chưa tải xong khi hết hạn sẽ bị bỏ qua
+        dedup_threshold: ngưỡng loại bài gần trùng nội dung giữa các nguồn (None để giữ tất cả)
+    Returns:
+        list: Danh sách dict bài viết (source, title, content, image_url, article_url, published_time),
+              giữ đúng thứ tự như khi crawl tuần tự
+    """
+    # Hạn chót riêng của lần crawl này, truyền cho từng tác vụ nên không ảnh hưởng các phiên crawl khác
+    deadline = get_crawl_deadline(deadline_seconds)
+    source_handlers = source_handlers or CRAWL_SOURCE_HANDLERS
+    work_queue = discover_articles(article_url_dict, source_handlers=source_handlers, max_workers=max_workers, deadline=deadline)
+    result_slots = []  # Mỗi phần tử là future (hoặc bài viết đã hoàn chỉnh/lấy từ cache) trả về một bài viết
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for source, entry, article in work_queue:
+            if article is not None:
+                result_slots.append(article)
+                continue
+
+            cached_article = get_cached_article(entry["id"]) if use_cache else None
+            if cached_article and cached_article["content"]:
+                cached_article["title"] = entry["title"] or cached_article["title"]
+                result_slots.append(cached_article)
+            else:
+                result_slots.append(executor.submit(call_with_crawl_deadline, deadline, _crawl_article_detail, source, source_handlers[source], entry))
+
+        raw_news_list = []
+        for slot in result_slots:
+            if isinstance(slot, dict):
+                raw_news_list.append(slot)
+                continue
+            try:
+                result = slot.result()
+            except Exception as e:
+                print(f"Lỗi khi crawl bài viết: {e}")
+                continue
+            raw_news_list.append(result)
+            if use_cache and result["content"]:
+                save_cached_article(result)
+
+    if dedup_threshold:
+        raw_news_list = remove_near_duplicate_articles(raw_news_list, dedup_threshold)
+    return raw_news_list
+
+
+def stream_articles(article_url_dict, source_handlers=None, max_workers=CRAWL_MAX_WORKERS, use_cache=True, deadline_seconds=CRAWL_DEADLINE_SECONDS, queue_size=CRAWL_STREAM_QUEUE_SIZE, dedup_threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Phiên bản streaming của crawl_articles: trả về từng bài viết ngay khi tải xong để các bước sau
+    (lọc, phân loại bằng Gemini...) chạy song song với việc crawl
+    - Luồng nền chạy discover_articles rồi tải chi tiết, chỉ giữ tối đa max_workers * 2 bài đang tải
+    - Bài viết đưa qua hàng đợi giới hạn queue_size, khi phía tiêu thụ chậm luồng nền sẽ dừng tải thêm
+    - Loại các bài trùng tiêu đề và gần trùng nội dung (NearDuplicateIndex) trước khi trả ra
+    Args:
+        giống crawl_articles, thêm queue_size là kích thước hàng đợi
+    Yields:
+        dict: bài viết (source, title, content, image_url, article_url, published_time), theo thứ tự tải xong
+    """
+    source_handlers = source_handlers or CRAWL_SOURCE_HANDLERS
+    article_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    end_marker = object()
+
+    def _put(item):
+        # Chờ khi hàng đợi đầy, bỏ qua nếu phía tiêu thụ đã dừng
+        while not stop_event.is_set():
+            try:
+                article_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _put_results(futures):
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Lỗi khi crawl bài viết: {e}")
+                continue
+            if use_cache and result["content"]:
+                save_cached_article(result)
+            _put(result)
+
+    def _produce():
+        deadline = get_crawl_deadline(deadline_seconds)
+        try:
+            work_queue = discover_articles(article_url_dict, source_handlers=source_handlers, max_workers=max_workers, deadline=deadline)
+            pending = set()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for source, entry, article in work_queue:
+                    if stop_event.is_set():
+                        executor.shutdown(cancel_futures=True)
+                        return
+                    if article is not None:
+                        _put(article)
+                        continue
+
+                    cached_article = get_cached_article(entry["id"]) if use_cache else None
+                    if cached_article and cached_article["content"]:
+                        cached_article["title"] = entry["title"] or cached_article["title"]
+                        _put(cached_article)
+                        continue
+
+                    if len(pending) >= max_workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        _put_results(done)
+                    pending.add(executor.submit(call_with_crawl_deadline, deadline, _crawl_article_detail, source, source_handlers[source], entry))
+
+                _put_results(pending)
+        except Exception as e:
+            print(f"Lỗi khi crawl bài viết: {e}")
+        finally:
+            _put(end_marker)
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+
+    seen_titles = set()
+    near_duplicate_index = NearDuplicateIndex(dedup_threshold) if dedup_threshold else None
+    try:
+        while True:
+            article = article_queue.get()
+            if article is end_marker:
+                break
+
+            title_key = " ".join((article["title"] or "").lower().split())
+            if title_key:
+                if title_key in seen_titles:
+                    continue
+                seen_titles.add(title_key)
+            if near_duplicate_index and near_duplicate_index.is_duplicate(article):
+                continue
+            yield article
+    finally:
+        stop_event.set()
+        producer.join()
@@ -7,6 +7,7 @@ from import_default import *
 from import_database import *
 from import_other import *
 from import_gemini import *
+from import_http import *
 
 wichart_item_name_dict = {
     "tien_te": {
@@ -66,7 +67,7 @@ wichart_api_url_dict = {
 
 
 def fetch_wichart_data(api_url: str):
-    response = requests.get(api_url)
+    response = http_get(api_url, timeout=15)
     response.raise_for_status()
     json_data = response.json()
 
@@ -1,5 +1,6 @@
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "import"))
 
@@ -7,6 +8,7 @@ from import_default import *
 from import_database import *
 from import_env import *
 from import_other import *
+from import_render import *
 
 R2_ENDPOINT = load_env("R2_ENDPOINT")
 R2_ACCESS_KEY_ID = load_env("R2_ACCESS_KEY_ID")
@@ -70,20 +72,23 @@ def _aws_signature_v4(method, url, headers, payload, access_key, secret_key, reg
     return authorization_header
 
 
-def upload_to_r2(data_bytes: bytes, filename: str, content_type: str = "image/png", folder_name: str = None):
+def upload_to_r2(data_bytes: bytes, filename: str, content_type: str = None, folder_name: str = None):
     """
     Upload file to R2 storage
 
     Args:
         data_bytes: File data as bytes
         filename: Name of the file
-        content_type: MIME type of the file
+        content_type: MIME type of the file (default: inferred from the file extension, image/png if unknown)
         folder_name: Optional folder name (will be created if doesn't exist)
 
     Returns:
         Public URL of uploaded file or None if failed
     """
 
+    if not content_type:
+        content_type = CHART_IMAGE_CONTENT_TYPES.get(os.path.splitext(filename)[1].lstrip(".").lower(), "image/png")
+
     # Tạo đường dẫn file với thư mục nếu có
     if folder_name:
         # Loại bỏ dấu / ở đầu và cuối folder_name
@@ -160,7 +165,27 @@ def upload_to_r2(data_bytes: bytes, filename: str, content_type: str = "image/pn
     return None
 
 
-def create_ticker_chart(df, height, width, path, png_name="chart.png"):
+# Định dạng ảnh hỗ trợ cho biểu đồ và content type tương ứng khi upload lên R2
+CHART_IMAGE_CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+}
+
+
+def create_ticker_chart(df, height, width, path, png_name="chart.png", image_format=None):
+    """
+    Vẽ biểu đồ giá đóng cửa của một mã, lưu file và trả về nội dung ảnh (chỉ render một lần)
+    Args:
+        image_format: "png", "jpg"/"jpeg", "webp" hoặc "svg" (mặc định lấy theo đuôi file png_name),
+                      svg trả về ảnh vector nên không phóng to
+    """
+    image_format = (image_format or os.path.splitext(png_name)[1].lstrip(".") or "png").lower()
+    if image_format not in CHART_IMAGE_CONTENT_TYPES:
+        raise ValueError(f"Định dạng ảnh '{image_format}' không được hỗ trợ, chỉ hỗ trợ: {', '.join(CHART_IMAGE_CONTENT_TYPES)}")
+
     # Tạo thư mục nếu chưa tồn tại
     os.makedirs(path, exist_ok=True)
 
@@ -250,10 +275,13 @@ def create_ticker_chart(df, height, width, path, png_name="chart.png"):
             tickfont=dict(size=12),
         ),
     )
+    # Render một lần rồi ghi lại chính nội dung đó ra file
+    image_bytes = render_figure(fig, image_format=image_format, width=width, height=height, scale=1 if image_format == "svg" else 4)
     full_path = os.path.join(path, png_name)
-    fig.write_image(full_path, width=width, height=height, scale=4)
+    with open(full_path, "wb") as f:
+        f.write(image_bytes)
 
-    return fig.to_image(format="png", width=width, height=height, scale=4)
+    return image_bytes
 
 
 # ==============================================================================
@@ -325,36 +353,38 @@ def _add_volume_chart(fig, df):
 
 
 def _add_technical_lines(fig, df, line_columns, line_name_dict):
-    """Thêm các đường chỉ báo kỹ thuật và trả về thông tin để tạo nhãn."""
-    line_info = []
-    for col in line_columns:
-        if col in df.columns and not df[col].isnull().all():
-            line_style_full = _get_style_for_column(col)
-            line_shape_value = line_style_full.pop("line_shape", None)
-
-            trace_args = {"x": df["date"], "y": df[col], "mode": "lines", "line": line_style_full, "name": col}
-
-            if line_shape_value:
-                trace_args["line_shape"] = line_shape_value
-
-            fig.add_trace(go.Scatter(**trace_args), row=1, col=1, secondary_y=False)
-
-            last_valid_idx = df[col].last_valid_index()
-            if last_valid_idx is not None:
-                display_name = line_name_dict.get(col, col)
-                last_value = df[col].loc[last_valid_idx]
-                line_info.append(
-                    {
-                        "name": f"{display_name}: {last_value:.2f}",
-                        "value": last_value,
-                        "color": _get_style_for_column(col).get("color", "black"),
-                    }
-                )
-    return line_info
-
-
-def _add_rsi_chart(fig, df, config):
-    """Thêm biểu đồ RSI hoàn chỉnh."""
+    """Thêm các đường chỉ báo kỹ thuật (một lần add_traces) và trả về thông tin để tạo nhãn."""
+    valid_columns = [col for col in line_columns if col in df.columns and not df[col].isnull().all()]
+    if not valid_columns:
+        return []
+
+    trace_list = []
+    for col in valid_columns:
+        line_style_full = _get_style_for_column(col)
+        line_shape_value = line_style_full.pop("line_shape", None)
+
+        trace_args = {"x": df["date"], "y": df[col], "mode": "lines", "line": line_style_full, "name": col}
+
+        if line_shape_value:
+            trace_args["line_shape"] = line_shape_value
+        trace_list.append(go.Scatter(**trace_args))
+
+    fig.add_traces(trace_list, rows=[1] * len(trace_list), cols=[1] * len(trace_list), secondary_ys=[False] * len(trace_list))
+
+    # Giá trị hợp lệ cuối cùng của tất cả các cột trong một lần tính
+    last_values = df[valid_columns].ffill().iloc[-1]
+    return [
+        {
+            "name": f"{line_name_dict.get(col, col)}: {last_values[col]:.2f}",
+            "value": last_values[col],
+            "color": _get_style_for_column(col).get("color", "black"),
+        }
+        for col in valid_columns
+    ]
+
+
+def _add_rsi_chart(fig, df, config, layout_items):
+    """Thêm biểu đồ RSI hoàn chỉnh, các đường, vùng và nhãn được gom vào layout_items để thêm một lần."""
     rsi_col = "RSI_14"
     if rsi_col not in df.columns or df[rsi_col].isnull().all():
         return
@@ -364,34 +394,51 @@ def _add_rsi_chart(fig, df, config):
         row=2,
         col=1,
     )
-    fig.add_hline(y=config["rsi_upper_bound"], line_dash="dash", line_color=config["color_rsi_bound_line"], line_width=1.5, row=2, col=1)
-    fig.add_hline(y=config["rsi_lower_bound"], line_dash="dash", line_color=config["color_rsi_bound_line"], line_width=1.5, row=2, col=1)
-    fig.add_hrect(
-        y0=config["rsi_lower_bound"],
-        y1=config["rsi_upper_bound"],
-        fillcolor=config["color_rsi_bound_fill"],
-        opacity=1,
-        layer="below",
-        line_width=0,
-        row=2,
-        col=1,
+    x_ref, y_ref = _get_subplot_axis_refs(fig, row=2)
+    for bound in (config["rsi_upper_bound"], config["rsi_lower_bound"]):
+        layout_items["shapes"].append(
+            dict(
+                type="line",
+                x0=0,
+                x1=1,
+                xref=f"{x_ref} domain",
+                y0=bound,
+                y1=bound,
+                yref=y_ref,
+                line=dict(dash="dash", color=config["color_rsi_bound_line"], width=1.5),
+            )
+        )
+    layout_items["shapes"].append(
+        dict(
+            type="rect",
+            x0=0,
+            x1=1,
+            xref=f"{x_ref} domain",
+            y0=config["rsi_lower_bound"],
+            y1=config["rsi_upper_bound"],
+            yref=y_ref,
+            fillcolor=config["color_rsi_bound_fill"],
+            opacity=1,
+            layer="below",
+            line=dict(width=0),
+        )
     )
 
     last_rsi = df[rsi_col].iloc[-1]
-    fig.add_annotation(
-        x=0.013,
-        y=1,
-        xref="x domain",
-        yref="y domain",
-        text=f"RSI 14: <b style='color:{config['color_rsi_line']};'>{last_rsi:.2f}</b>",
-        showarrow=False,
-        xanchor="left",
-        yanchor="top",
-        font=dict(size=config["font_size_subplot_title"], family=config["font_family"], color="black"),
-        xshift=-13,
-        yshift=18,
-        row=2,
-        col=1,
+    layout_items["annotations"].append(
+        dict(
+            x=0.013,
+            y=1,
+            xref=f"{x_ref} domain",
+            yref=f"{y_ref} domain",
+            text=f"RSI 14: <b style='color:{config['color_rsi_line']};'>{last_rsi:.2f}</b>",
+            showarrow=False,
+            xanchor="left",
+            yanchor="top",
+            font=dict(size=config["font_size_subplot_title"], family=config["font_family"], color="black"),
+            xshift=-13,
+            yshift=18,
+        )
     )
 
     y_axis_range = df[rsi_col].max() - df[rsi_col].min()
@@ -433,22 +480,22 @@ def _add_rsi_chart(fig, df, config):
     ]
 
     for anno in annotations:
-        fig.add_annotation(
-            x=config["label_x_position"],
-            y=anno["y"],
-            xref="x domain",
-            yref="y",
-            text=anno["text"],
-            ax=-10,
-            ay=0,
-            xanchor="left",
-            yanchor="middle",
-            font={**tag_font, "color": anno["font_color"]},
-            bgcolor=anno["bgcolor"],
-            bordercolor=anno["bordercolor"],
-            borderwidth=1,
-            row=2,
-            col=1,
+        layout_items["annotations"].append(
+            dict(
+                x=config["label_x_position"],
+                y=anno["y"],
+                xref=f"{x_ref} domain",
+                yref=y_ref,
+                text=anno["text"],
+                ax=-10,
+                ay=0,
+                xanchor="left",
+                yanchor="middle",
+                font={**tag_font, "color": anno["font_color"]},
+                bgcolor=anno["bgcolor"],
+                bordercolor=anno["bordercolor"],
+                borderwidth=1,
+            )
         )
 
 
@@ -457,11 +504,12 @@ def _add_rsi_chart(fig, df, config):
 # ==============================================================================
 
 
-def _process_and_add_annotations(fig, df, line_info, symbol_name, config):
+def _process_and_add_annotations(fig, df, line_info, symbol_name, config, layout_items):
     """
     Hàm tổng hợp xử lý và thêm tất cả các nhãn giá vào biểu đồ chính.
     Logic mới: Gộp tất cả các tag, sắp xếp theo giá trị, sau đó đẩy tuần tự
     từ trên xuống để đảm bảo không chồng chéo và giữ đúng thứ tự.
+    Vị trí các tag được tính bằng NumPy, annotation được gom vào layout_items để thêm một lần.
     """
     # --- 1. GOM TẤT CẢ CÁC TAG LẠI ---
     last_close = df["close"].iloc[-1]
@@ -479,34 +527,31 @@ def _process_and_add_annotations(fig, df, line_info, symbol_name, config):
     )
 
     # Vẽ đường hline cho giá đóng cửa
-    fig.add_hline(y=last_close, line_color=price_color, line_width=1, line_dash="dash", row=1, col=1)
+    x_ref, y_ref = _get_subplot_axis_refs(fig, row=1)
+    layout_items["shapes"].append(
+        dict(type="line", x0=0, x1=1, xref=f"{x_ref} domain", y0=last_close, y1=last_close, yref=y_ref, line=dict(color=price_color, width=1, dash="dash"))
+    )
 
     # --- 2. SẮP XẾP TẤT CẢ TAG THEO GIÁ TRỊ GIẢM DẦN ---
-    # Đây là bước quan trọng nhất để đảm bảo thứ tự trực quan
-    sorted_tags = sorted(line_info, key=lambda x: x["value"], reverse=True)
+    # Đây là bước quan trọng nhất để đảm bảo thứ tự trực quan (sắp xếp ổn định giống sorted(reverse=True))
+    tag_values = np.array([tag_info["value"] for tag_info in line_info], dtype=float)
+    sorted_order = np.argsort(-tag_values, kind="stable")
+    sorted_values = tag_values[sorted_order]
 
-    # --- 3. TÍNH TOÁN VỊ TRÍ Y AN TOÀN VÀ VẼ LÊN BIỂU ĐỒ ---
+    # --- 3. TÍNH TOÁN VỊ TRÍ Y AN TOÀN ---
     visible_y_range = df["high"].max() - df["low"].min()
     if visible_y_range == 0:
         visible_y_range = df["close"].iloc[0] * 0.1  # Tránh chia cho 0
     min_spacing = visible_y_range * config["label_min_spacing_ratio"]
 
-    last_placed_y = None  # Dùng để lưu vị trí Y của tag ngay phía trên
-
-    for tag_info in sorted_tags:
-        y_pos = tag_info["value"]
-
-        # Nếu đây không phải tag đầu tiên, kiểm tra xung đột với tag ngay phía trên nó
-        if last_placed_y is not None:
-            # Nếu vị trí hiện tại quá gần vị trí đã đặt trước đó (tức là nằm trong vùng an toàn)
-            if y_pos > last_placed_y - min_spacing:
-                # Đẩy vị trí hiện tại xuống để tạo khoảng trống
-                y_pos = last_placed_y - min_spacing
+    # Mỗi tag cách tag ngay phía trên ít nhất min_spacing: y[i] = min(value[i], y[i-1] - min_spacing)
+    # tương đương y[i] + i * min_spacing = min lũy kế của value[i] + i * min_spacing
+    spacing_offsets = np.arange(len(sorted_values)) * min_spacing
+    y_positions = np.minimum.accumulate(sorted_values + spacing_offsets) - spacing_offsets
 
-        # Cập nhật vị trí cuối cùng đã đặt cho lần lặp tiếp theo
-        last_placed_y = y_pos
-
-        # Chuẩn bị style và vẽ annotation
+    # --- 4. TẠO ANNOTATION CHO TỪNG TAG ---
+    for tag_index, y_pos in zip(sorted_order, y_positions):
+        tag_info = line_info[tag_index]
         is_price_tag = tag_info.get("is_price_tag", False)
 
         if is_price_tag:
@@ -518,22 +563,22 @@ def _process_and_add_annotations(fig, df, line_info, symbol_name, config):
             bgcolor = config["tag_bgcolor"]
             bordercolor = tag_info["color"]
 
-        fig.add_annotation(
-            x=config["label_x_position"],
-            y=y_pos,
-            xref="x domain",
-            yref="y",
-            text=f"<b>{tag_info['name']}</b>",
-            font=font_config,
-            bgcolor=bgcolor,
-            bordercolor=bordercolor,
-            borderwidth=1,
-            xanchor="left",
-            yanchor="middle",
-            ax=-10,
-            ay=0,
-            row=1,
-            col=1,
+        layout_items["annotations"].append(
+            dict(
+                x=config["label_x_position"],
+                y=float(y_pos),
+                xref=f"{x_ref} domain",
+                yref=y_ref,
+                text=f"<b>{tag_info['name']}</b>",
+                font=font_config,
+                bgcolor=bgcolor,
+                bordercolor=bordercolor,
+                borderwidth=1,
+                xanchor="left",
+                yanchor="middle",
+                ax=-10,
+                ay=0,
+            )
         )
 
 
@@ -542,7 +587,7 @@ def _process_and_add_annotations(fig, df, line_info, symbol_name, config):
 # ==============================================================================
 
 
-def _configure_layout_and_axes(fig, df, max_volume, config, width, height):
+def _configure_layout_and_axes(fig, df, max_volume, config, width, height, layout_items):
     """Cấu hình layout tổng thể, các trục X, Y và tiêu đề."""
     last_day = df.iloc[-1]
     o, h, l, c = last_day.get("open", 0), last_day.get("high", 0), last_day.get("low", 0), last_day.get("close", 0)
@@ -616,10 +661,29 @@ def _configure_layout_and_axes(fig, df, max_volume, config, width, height):
         tickfont=dict(size=config["font_size_axis"], color=config["tick_color"]),
     )
 
-    for i in range(10, len(df), 10):
-        fig.add_shape(
-            type="line", x0=i, x1=i, y0=0, y1=1, xref="x", yref="paper", line=dict(color=config["grid_color"], width=1), layer="below"
+    layout_items["shapes"].extend(
+        dict(type="line", x0=i, x1=i, y0=0, y1=1, xref="x", yref="paper", line=dict(color=config["grid_color"], width=1), layer="below")
+        for i in range(10, len(df), 10)
+    )
+
+
+def _get_subplot_axis_refs(fig, row, col=1):
+    """Tên trục (xref, yref) của subplot, ví dụ ("x", "y") cho hàng 1 và ("x2", "y3") cho hàng 2"""
+    subplot = fig.get_subplot(row, col)
+    return subplot.xaxis.plotly_name.replace("axis", ""), subplot.yaxis.plotly_name.replace("axis", "")
+
+
+def _apply_layout_items(fig, layout_items):
+    """Thêm tất cả annotation và shape trong một lần update_layout, tạm tắt validate của plotly"""
+    previous_validate = getattr(fig.layout, "_validate", True)
+    fig.layout._validate = False
+    try:
+        fig.update_layout(
+            annotations=list(fig.layout.annotations) + layout_items["annotations"],
+            shapes=list(fig.layout.shapes) + layout_items["shapes"],
         )
+    finally:
+        fig.layout._validate = previous_validate
 
 
 def _generate_xaxis_ticks(df):
@@ -696,6 +760,89 @@ def create_chart_config(title_font_size, axis_font_size, tag_font_size, price_ta
     }
 
 
+# ==============================================================================
+# CACHE ẢNH BIỂU ĐỒ THEO NỘI DUNG ĐẦU VÀO (LRU TRONG BỘ NHỚ + LƯU RA Ổ ĐĨA)
+# ==============================================================================
+CHART_CACHE_DIR = os.path.join(os.path.dirname(os.getcwd()), "cache", "charts")
+CHART_CACHE_MEMORY_ITEMS = 32  # Số ảnh tối đa giữ trong bộ nhớ
+CHART_CACHE_DISK_BYTES = 200 * 1024 * 1024  # Tổng dung lượng tối đa của ảnh trên ổ đĩa, xóa ảnh ít dùng nhất khi vượt quá
+
+_chart_cache_dict = OrderedDict()
+_chart_cache_lock = threading.Lock()
+# Mã nguồn module là một phần của khóa cache, sửa cách vẽ biểu đồ sẽ tự động bỏ qua ảnh cũ
+with open(__file__, "rb") as _module_file:
+    _CHART_CODE_HASH = hashlib.sha256(_module_file.read()).hexdigest()
+
+
+def _get_chart_cache_key(df, width, height, line_name_dict, line_columns, chart_config):
+    """Khóa cache từ dữ liệu df và toàn bộ tham số vẽ, None nếu dữ liệu không hash được"""
+    try:
+        chart_df = df.drop(columns=["volume_color"], errors="ignore")
+        hasher = hashlib.sha256(_CHART_CODE_HASH.encode("utf-8"))
+        hasher.update(pd.util.hash_pandas_object(chart_df, index=True).values.tobytes())
+        chart_params = {
+            "columns": [str(col) for col in chart_df.columns],
+            "width": width,
+            "height": height,
+            "line_name_dict": line_name_dict,
+            "line_columns": list(line_columns),
+            "chart_config": chart_config,
+        }
+        hasher.update(json.dumps(chart_params, sort_keys=True, default=str).encode("utf-8"))
+        return hasher.hexdigest()
+    except Exception as e:
+        print(f"Không thể tạo khóa cache biểu đồ: {e}")
+        return None
+
+
+def _get_cached_chart(cache_key):
+    """Lấy ảnh đã render từ bộ nhớ, nếu không có thì tìm trên ổ đĩa"""
+    with _chart_cache_lock:
+        if cache_key in _chart_cache_dict:
+            _chart_cache_dict.move_to_end(cache_key)
+            return _chart_cache_dict[cache_key]
+
+    cache_path = os.path.join(CHART_CACHE_DIR, f"{cache_key}.png")
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            image_bytes = f.read()
+        os.utime(cache_path)  # Cập nhật thời gian để ảnh vừa dùng không bị xóa trước
+    except OSError:
+        return None
+    _put_chart_in_memory(cache_key, image_bytes)
+    return image_bytes
+
+
+def _put_chart_in_memory(cache_key, image_bytes):
+    with _chart_cache_lock:
+        _chart_cache_dict[cache_key] = image_bytes
+        _chart_cache_dict.move_to_end(cache_key)
+        while len(_chart_cache_dict) > CHART_CACHE_MEMORY_ITEMS:
+            _chart_cache_dict.popitem(last=False)
+
+
+def _save_cached_chart(cache_key, image_bytes):
+    """Lưu ảnh vào bộ nhớ và ổ đĩa, dọn các ảnh ít dùng nhất khi tổng dung lượng vượt quá CHART_CACHE_DISK_BYTES"""
+    _put_chart_in_memory(cache_key, image_bytes)
+    try:
+        os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CHART_CACHE_DIR, f"{cache_key}.png"), "wb") as f:
+            f.write(image_bytes)
+
+        cache_file_list = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(CHART_CACHE_DIR) if entry.name.endswith(".png")]
+        total_bytes = sum(size for _, size, _ in cache_file_list)
+        # Xóa từ ảnh ít dùng nhất (thời gian sửa cũ nhất) đến khi đủ dung lượng
+        for _, size, cache_file in sorted(cache_file_list):
+            if total_bytes <= CHART_CACHE_DISK_BYTES:
+                break
+            os.remove(cache_file)
+            total_bytes -= size
+    except OSError as e:
+        print(f"Lỗi khi ghi cache biểu đồ: {e}")
+
+
 def create_financial_chart(
     df: pd.DataFrame,
     width,
@@ -707,17 +854,28 @@ def create_financial_chart(
     image_name: str,
     symbol_name: str = "VNINDEX",
     time_frame: str = "1D",
+    use_cache: bool = True,
 ):
     """
     Hàm chính để tạo biểu đồ tài chính hoàn chỉnh.
+    use_cache: nếu dữ liệu và tham số giống hệt một lần vẽ trước, dùng lại ảnh đã render,
+               bỏ qua hoàn toàn bước dựng figure và render Kaleido
+    Returns:
+        tuple: (fig, image_bytes); fig là None khi lấy ảnh từ cache, (None, None) nếu df rỗng
     """
     if df.empty:
         print("DataFrame is empty. Cannot create chart.")
-        return go.Figure()
+        return None, None
 
     chart_config["symbol_name"] = symbol_name
     chart_config["time_frame"] = time_frame
 
+    cache_key = _get_chart_cache_key(df, width, height, line_name_dict, line_columns, chart_config) if use_cache else None
+    image_bytes = _get_cached_chart(cache_key) if cache_key else None
+    if image_bytes is not None:
+        _write_chart_file(path, image_name, image_bytes)
+        return None, image_bytes
+
     line_columns, max_volume = _prepare_chart_data(df, chart_config, line_columns)
 
     fig = make_subplots(
@@ -729,29 +887,91 @@ def create_financial_chart(
         specs=[[{"secondary_y": True}], [{"secondary_y": False}]],
     )
 
+    # Annotation và shape của các thành phần được gom lại để thêm vào figure một lần
+    layout_items = {"annotations": [], "shapes": []}
+
     # Các hàm vẽ thành phần
     _add_candlestick_chart(fig, df, chart_config)
     _add_volume_chart(fig, df)
     line_info = _add_technical_lines(fig, df, line_columns, line_name_dict)
-    _add_rsi_chart(fig, df, chart_config)
+    _add_rsi_chart(fig, df, chart_config, layout_items)
 
     # Xử lý và vẽ annotations với logic mới
-    _process_and_add_annotations(fig, df, line_info, symbol_name, chart_config)
+    _process_and_add_annotations(fig, df, line_info, symbol_name, chart_config, layout_items)
 
     # Cấu hình layout cuối cùng
-    _configure_layout_and_axes(fig, df, max_volume, chart_config, width, height)
+    _configure_layout_and_axes(fig, df, max_volume, chart_config, width, height, layout_items)
+    _apply_layout_items(fig, layout_items)
 
     # Chuyển đổi fig thành dạng bytes để có thể upload hoặc dùng sau này
-    image_bytes = fig.to_image(format="png", width=width, height=height, scale=2)
+    # Render qua render server dùng chung (Kaleido đã khởi động sẵn), tự render nếu server không chạy
+    image_bytes = render_figure(fig, image_format="png", width=width, height=height, scale=2)
+    if cache_key:
+        _save_cached_chart(cache_key, image_bytes)
+
+    _write_chart_file(path, image_name, image_bytes)
+
+    # Trả về 2 giá trị như code gốc của bạn mong đợi
+    return fig, image_bytes
 
-    # Lưu file nếu có đường dẫn
+
+def _write_chart_file(path, image_name, image_bytes):
+    """Lưu file nếu có đường dẫn, ghi lại từ dạng bytes đã tạo để không phải render lần 2"""
     if path and image_name:
         if not os.path.exists(path):
             os.makedirs(path)
-        full_path = os.path.join(path, image_name)
-        # Ghi lại từ dạng bytes đã tạo để không phải render lần 2
-        with open(full_path, "wb") as f:
+        with open(os.path.join(path, image_name), "wb") as f:
             f.write(image_bytes)
-            
-    # Trả về 2 giá trị như code gốc của bạn mong đợi
-    return fig, image_bytes
+
+
+def _render_chart_spec(spec, max_retries):
+    """Dựng và render một biểu đồ trong tiến trình con, trả về (image_name, image_bytes), image_bytes là None nếu df rỗng"""
+    for attempt in range(max_retries):
+        try:
+            _, image_bytes = create_financial_chart(**spec)
+            return spec["image_name"], image_bytes
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise e
+
+
+def render_charts(specs, max_workers=None, max_retries=5):
+    """
+    Dựng và render nhiều biểu đồ tài chính song song trên pool tiến trình (mặc định bằng số core)
+    Args:
+        specs: list dict tham số của create_financial_chart (df, width, height, line_name_dict, line_columns,
+               chart_config, path, image_name, symbol_name, time_frame), image_name không được trùng nhau
+        max_retries: số lần thử lại cho mỗi biểu đồ
+    Returns:
+        dict: {image_name: image_bytes}, biểu đồ có df rỗng hoặc lỗi sau max_retries lần thử sẽ bị bỏ qua
+    Lưu ý: trên Windows (spawn) mỗi tiến trình con import lại module này, tức là chạy lại load_env
+    (giải mã .env) và tạo lại các client Mongo/SQL/R2, mất khoảng vài giây mỗi tiến trình.
+    Chỉ nên dùng khi số biểu đồ đủ nhiều để bù lại chi phí này, ít biểu đồ thì gọi create_financial_chart trực tiếp.
+    """
+    image_dict = {}
+    if not specs:
+        return image_dict
+
+    # Chỉ một biểu đồ thì render ngay trong tiến trình hiện tại, không cần khởi động pool
+    if len(specs) == 1:
+        try:
+            image_name, image_bytes = _render_chart_spec(specs[0], max_retries)
+            if image_bytes is not None:
+                image_dict[image_name] = image_bytes
+        except Exception as e:
+            print(f"Lỗi khi render biểu đồ '{specs[0]['image_name']}': {e}")
+        return image_dict
+
+    max_workers = max_workers or min(len(specs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_dict = {executor.submit(_render_chart_spec, spec, max_retries): spec["image_name"] for spec in specs}
+        for future in as_completed(future_dict):
+            try:
+                image_name, image_bytes = future.result()
+                if image_bytes is not None:
+                    image_dict[image_name] = image_bytes
+            except Exception as e:
+                print(f"Lỗi khi render biểu đồ '{future_dict[future]}': {e}")
+
+    # Trả về theo đúng thứ tự của specs
+    return {spec["image_name"]: image_dict[spec["image_name"]] for spec in specs if spec["image_name"] in image_dict}
@@ -0,0 +1,329 @@
+"""
+Benchmark crawler tin tức chạy offline trên bộ HTML đã ghi lại
+
+Ghi lại fixtures từ các trang thật (cần mạng, chạy lại khi parser hoặc cấu trúc trang thay đổi):
+    python development/benchmark/crawler_benchmark.py --record
+
+Chạy benchmark trên fixtures qua server HTTP cục bộ:
+    python development/benchmark/crawler_benchmark.py [--repeat 3] [--rate-limit]
+
+Kết quả gồm:
+- Thời gian parse thuần (ms/trang) của _make_soup và các hàm _parse_* chạy trực tiếp trên nội dung fixtures, không qua HTTP
+- ms/trang (tải qua localhost + parse) của từng hàm lấy danh sách, chi tiết bài viết và thời gian đăng
+- Số trang/giây của crawl_articles và bộ nhớ đỉnh (tracemalloc) của từng bước
+
+Fixtures là HTML của các trang báo nên không được commit vào repo, cần ghi lại một lần trên máy có mạng
+bằng --record (lưu vào development/benchmark/fixtures/ gồm manifest.json và các file .bin).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+APP_NOTEBOOK_DIR = os.path.abspath(os.path.join(BENCHMARK_DIR, "..", "..", "app", "notebook"))
+
+# Các module trong app/ tìm thư mục import theo thư mục làm việc giống khi chạy notebook
+os.chdir(APP_NOTEBOOK_DIR)
+sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "import"))
+sys.path.append(os.path.join(os.path.dirname(os.getcwd()), "module"))
+
+import pandas as pd
+
+# Chỉ import HTTP client và các hàm crawl/parse, không cần secrets Mongo/MSSQL của import_database
+import import_http
+import get_and_crawl_data
+from import_http import http_get, set_http_replay_server
+from get_and_crawl_data import (
+    convert_published_time_series,
+    crawl_articles,
+    discover_articles,
+    get_article_cafef_full,
+    get_article_vietnambiz_full,
+    get_article_vietstock,
+    get_article_vneconomy,
+    get_cafef_articles_list,
+    get_cafef_published_time,
+    get_vietnambiz_articles_list,
+    get_vietnambiz_published_time,
+    get_vietstock_articles_list,
+)
+
+# Một vài danh mục/RSS mỗi nguồn, đủ để đo mà không làm fixtures quá lớn
+BENCHMARK_URL_DICT = {
+    "VietStock": {
+        "https://vietstock.vn/761/kinh-te/vi-mo.rss": 5,
+        "https://vietstock.vn/830/chung-khoan/co-phieu.rss": 5,
+    },
+    "CafeF": {
+        "https://cafef.vn/vi-mo-dau-tu.chn": 5,
+        "https://cafef.vn/thi-truong-chung-khoan.chn": 5,
+    },
+    "Vietnambiz": {
+        "https://vietnambiz.vn/tai-chinh.htm": 5,
+        "https://vietnambiz.vn/chung-khoan.htm": 5,
+    },
+    "VnEconomy": {
+        "https://vneconomy.vn/tai-chinh.rss": 10,
+    },
+}
+
+BENCHMARK_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+LISTING_FUNCTIONS = {
+    "VietStock": get_vietstock_articles_list,
+    "CafeF": get_cafef_articles_list,
+    "Vietnambiz": get_vietnambiz_articles_list,
+    "VnEconomy": get_article_vneconomy,
+}
+ARTICLE_FUNCTIONS = {
+    "VietStock": get_article_vietstock,
+    "CafeF": get_article_cafef_full,
+    "Vietnambiz": get_article_vietnambiz_full,
+}
+PUBLISHED_TIME_FUNCTIONS = {
+    "CafeF": get_cafef_published_time,
+    "Vietnambiz": get_vietnambiz_published_time,
+}
+# Các hàm parse thuần trên HTML bài viết đã parse thành soup (đo riêng, không tính thời gian tải)
+PARSE_FUNCTIONS = {
+    "CafeF": [get_and_crawl_data._parse_cafef_article, get_and_crawl_data._parse_cafef_published_time],
+    "Vietnambiz": [get_and_crawl_data._parse_vietnambiz_article, get_and_crawl_data._parse_vietnambiz_published_time],
+}
+
+
+def _fixture_key(url):
+    """Khóa của một trang trong fixtures: host/path?query (bỏ scheme để http/https dùng chung)"""
+    parsed = urlparse(url)
+    return f"{parsed.netloc.lower()}{parsed.path}" + (f"?{parsed.query}" if parsed.query else "")
+
+
+def _load_manifest(fixture_dir):
+    manifest_path = os.path.join(fixture_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        print(f"Lỗi: Không tìm thấy {manifest_path}, fixtures không có sẵn trong repo, hãy chạy với --record trước (cần mạng).")
+        sys.exit(1)
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ==============================================================================
+# GHI LẠI FIXTURES TỪ TRANG THẬT
+# ==============================================================================
+def record_fixtures(article_url_dict, fixture_dir):
+    """Tải các trang danh mục/RSS và toàn bộ bài viết tìm được, lưu nội dung gốc kèm manifest.json"""
+    os.makedirs(fixture_dir, exist_ok=True)
+    manifest = {"article_url_dict": article_url_dict, "pages": {}}
+
+    def _record(url, source, kind, max_articles=None):
+        key = _fixture_key(url)
+        if key in manifest["pages"]:
+            return
+        try:
+            response = http_get(url, headers=BENCHMARK_HEADERS, timeout=15)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Lỗi khi ghi lại {url}: {e}")
+            return
+        file_name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".bin"
+        with open(os.path.join(fixture_dir, file_name), "wb") as f:
+            f.write(response.content)
+        manifest["pages"][key] = {
+            "url": url,
+            "source": source,
+            "kind": kind,
+            "max_articles": max_articles,
+            "file": file_name,
+            "content_type": response.headers.get("Content-Type", "text/html; charset=utf-8"),
+        }
+
+    for source, rss_list in article_url_dict.items():
+        for rss_url, num_articles in rss_list.items():
+            _record(rss_url, source, "listing", num_articles)
+
+    for source, entry, article in discover_articles(article_url_dict):
+        if entry is not None:
+            _record(entry["id"], source, "article")
+
+    with open(os.path.join(fixture_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi lại {len(manifest['pages'])} trang vào {fixture_dir}")
+
+
+# ==============================================================================
+# SERVER HTTP CỤC BỘ PHÁT LẠI FIXTURES
+# ==============================================================================
+def start_replay_server(manifest, fixture_dir):
+    """Chạy server phát lại ở luồng nền, trả về (server, bộ đếm request)"""
+    page_dict = {}
+    for key, page in manifest["pages"].items():
+        with open(os.path.join(fixture_dir, page["file"]), "rb") as f:
+            page_dict[key] = (f.read(), page["content_type"])
+    request_counter = {"count": 0, "lock": threading.Lock()}
+
+    class _FixtureRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with request_counter["lock"]:
+                request_counter["count"] += 1
+            page = page_dict.get(self.path.lstrip("/"))
+            if page is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body, content_type = page
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, request_counter
+
+
+# ==============================================================================
+# ĐO HIỆU NĂNG
+# ==============================================================================
+def _print_report(name, duration_list, peak_bytes):
+    if not duration_list:
+        print(f"{name:<45} không có fixture")
+        return
+    duration_ms = sorted(d * 1000 for d in duration_list)
+    p95_ms = duration_ms[min(len(duration_ms) - 1, int(len(duration_ms) * 0.95))]
+    print(
+        f"{name:<45} {len(duration_ms):>5} trang  {statistics.median(duration_ms):>8.1f} ms/trang (p95 {p95_ms:>8.1f})"
+        f"  bộ nhớ đỉnh {peak_bytes / 1024 / 1024:>6.1f} MB"
+    )
+
+
+def _measure_each(name, call_list, repeat):
+    """Gọi tuần tự từng hàm trong call_list, đo thời gian mỗi lần gọi và bộ nhớ đỉnh"""
+    duration_list = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        for call in call_list:
+            start_time = time.perf_counter()
+            call()
+            duration_list.append(time.perf_counter() - start_time)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _print_report(name, duration_list, peak_bytes)
+
+
+def run_parse_benchmark(manifest, fixture_dir, repeat=1):
+    """Đo thời gian parse thuần: _make_soup và từng hàm _parse_* chạy trực tiếp trên nội dung fixtures"""
+    print("Thời gian parse thuần trên nội dung fixtures (không tải qua HTTP)\n")
+    for source, parse_function_list in PARSE_FUNCTIONS.items():
+        body_list = []
+        for page in manifest["pages"].values():
+            if page["source"] == source and page["kind"] == "article":
+                with open(os.path.join(fixture_dir, page["file"]), "rb") as f:
+                    body_list.append(f.read())
+
+        _measure_each(f"{source}: _make_soup", [(lambda body=body: get_and_crawl_data._make_soup(body)) for body in body_list], repeat)
+        soup_list = [get_and_crawl_data._make_soup(body) for body in body_list]
+        for parse_function in parse_function_list:
+            call_list = [(lambda soup=soup: parse_function(soup)) for soup in soup_list]
+            _measure_each(f"{source}: {parse_function.__name__}", call_list, repeat)
+    print()
+
+
+def run_benchmark(manifest, fixture_dir, repeat=1):
+    server, request_counter = start_replay_server(manifest, fixture_dir)
+    set_http_replay_server(f"http://127.0.0.1:{server.server_address[1]}")
+    pages = manifest["pages"].values()
+
+    print(f"Server phát lại: http://127.0.0.1:{server.server_address[1]} ({len(manifest['pages'])} trang)")
+    print("Thời gian tải qua localhost + parse mỗi trang (chạy tuần tự)\n")
+
+    try:
+        for source, get_articles in LISTING_FUNCTIONS.items():
+            call_list = [
+                (lambda page=page: get_articles(page["url"], page["max_articles"]))
+                for page in pages
+                if page["source"] == source and page["kind"] == "listing"
+            ]
+            _measure_each(f"{get_articles.__name__}", call_list, repeat)
+
+        for source, get_article in ARTICLE_FUNCTIONS.items():
+            call_list = [(lambda page=page: get_article(page["url"])) for page in pages if page["source"] == source and page["kind"] == "article"]
+            _measure_each(f"{get_article.__name__}", call_list, repeat)
+
+        published_time_list = []
+        for source, get_published_time in PUBLISHED_TIME_FUNCTIONS.items():
+            call_list = [
+                (lambda page=page: published_time_list.append(get_published_time(page["url"])))
+                for page in pages
+                if page["source"] == source and page["kind"] == "article"
+            ]
+            _measure_each(f"{get_published_time.__name__}", call_list, repeat)
+
+        start_time = time.perf_counter()
+        convert_published_time_series(pd.Series(published_time_list, dtype=object))
+        print(f"{'convert_published_time_series':<45} {len(published_time_list):>5} giá trị  {(time.perf_counter() - start_time) * 1000:>8.1f} ms tổng")
+
+        # Crawl toàn bộ như trong notebook để đo thông lượng khi chạy song song
+        print()
+        for _ in range(repeat):
+            with request_counter["lock"]:
+                request_counter["count"] = 0
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            article_list = crawl_articles(manifest["article_url_dict"], use_cache=False, dedup_threshold=None)
+            elapsed = time.perf_counter() - start_time
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{'crawl_articles':<45} {request_counter['count']:>5} trang  {request_counter['count'] / elapsed:>8.1f} trang/s"
+                f"  {len(article_list)} bài trong {elapsed:.2f}s  bộ nhớ đỉnh {peak_bytes / 1024 / 1024:>6.1f} MB"
+            )
+    finally:
+        set_http_replay_server(None)
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawler tin tức trên bộ HTML đã ghi lại")
+    parser.add_argument("--record", action="store_true", help="Tải trang thật và ghi lại fixtures")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="Thư mục fixtures")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần lặp lại mỗi phép đo")
+    parser.add_argument("--rate-limit", action="store_true", help="Giữ giới hạn tốc độ theo host như khi chạy thật")
+    args = parser.parse_args()
+
+    # Dùng cache tạm để không đọc/ghi vào cache bài viết thật của notebook
+    get_and_crawl_data.ARTICLE_CACHE_PATH = os.path.join(tempfile.mkdtemp(prefix="crawler_benchmark_"), "articles.sqlite")
+
+    if args.record:
+        record_fixtures(BENCHMARK_URL_DICT, args.fixtures)
+        return
+
+    if not args.rate_limit:
+        import_http.HTTP_RATE_PER_HOST = 1e9
+        import_http.HTTP_BURST_PER_HOST = 1e9
+    manifest = _load_manifest(args.fixtures)
+    run_parse_benchmark(manifest, args.fixtures, repeat=args.repeat)
+    run_benchmark(manifest, args.fixtures, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -112,7 +112,9 @@ required_hiddenimports = [
     'win32console',
     'sqlalchemy.dialects.mysql',
     'cryptography.fernet',
-    'alpha_vantage.foreignexchange'
+    'alpha_vantage.foreignexchange',
+    'http.server',
+    'concurrent.futures.process',
 ]
 
 # --- TỔNG HỢP CÁC THÀNH PHẦN ---
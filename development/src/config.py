@@ -46,3 +46,7 @@ LOG_TITLE_NOTEBOOK_PRINT = "Output từ '{nb_name}' tại '{section_name}'"
 LOG_TITLE_NOTEBOOK_ERROR = "Lỗi khi chạy '{nb_name}' tại '{section_name}'"
 MAX_CONSECUTIVE_ERRORS_CONTINOUS = 99
 MAX_CONSECUTIVE_ERRORS_FINITE = 5
+
+# ===== CÀI ĐẶT RENDER SERVER (KALEIDO) =====
+RENDER_SERVER_ENABLED = True
+RENDER_SERVER_URL = "http://127.0.0.1:8765"  # Phải khớp với RENDER_SERVER_URL trong app/import/import_render.py
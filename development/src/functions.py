@@ -7,6 +7,7 @@ import os
 import sys
 import traceback
 import time
+import urllib.request
 import nbformat
 from multiprocessing import Process, Queue, Event
 
@@ -363,3 +364,37 @@ def run_notebook_with_individual_logging(
     running_processes[notebook_path] = {"process": process, "stop_event": stop_event, "queue": log_queue, "card": card}
 
     process.start()
+
+
+# --- RENDER SERVER (KALEIDO) DÙNG CHUNG CHO CÁC NOTEBOOK ---
+def _run_render_server_process(import_path):
+    if os.path.exists(import_path) and import_path not in sys.path:
+        sys.path.insert(0, import_path)
+    import import_render
+
+    import_render.run_render_server()
+
+
+def start_render_server(import_path):
+    """
+    Khởi động render server ở tiến trình riêng ngay khi mở ứng dụng, các tiến trình Kaleido được
+    khởi động sẵn để notebook không phải chờ Chromium ở lần render đầu tiên
+    """
+    if not config.RENDER_SERVER_ENABLED:
+        return None
+    process = Process(target=_run_render_server_process, args=(import_path,))
+    process.start()
+    log_message(f"Đã khởi động render server tại {config.RENDER_SERVER_URL}")
+    return process
+
+
+def stop_render_server(process, timeout=5):
+    if process is None or not process.is_alive():
+        return
+    try:
+        urllib.request.urlopen(urllib.request.Request(f"{config.RENDER_SERVER_URL}/shutdown", method="POST"), timeout=timeout)
+    except Exception:
+        pass
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
@@ -106,6 +106,7 @@ def main():
             self.schedule_manager_widget = None
             self.set_window_icon()
             self.running_processes = {}
+            self.render_server_process = functions.start_render_server(self.import_path)
             self.setup_ui()
             self.apply_stylesheet()
             self._update_window_minimum_size()
@@ -251,6 +252,7 @@ def main():
             total_running = sum(len(s.running_processes) for s in self.sections.values())
             reply = functions.handle_close_event(total_running, self)
             if reply:
+                functions.stop_render_server(self.render_server_process)
                 if a0:
                     a0.accept()
             else: